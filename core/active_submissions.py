@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import os
+import threading
+from sqlalchemy.orm import Session
+from db.db_config import SHARDED, use_shard_of
+from models.submission import Submission, SubmissionStatus
+from models.exam_room import ExamRoom
+from core.invalidation import bus
+from core.counters import count_submission_transition
+from core.live_stats import publish_submission_event
+from repositories.submission import update_active_attempt
+
+# Above this many entries, attempts past their deadline are purged on insert
+ACTIVE_SUBMISSIONS_MAX = int(os.getenv("ACTIVE_SUBMISSIONS_MAX", "50000"))
+
+@dataclass(frozen=True)
+class ActiveSubmission:
+    """What the autosave path needs to know about an attempt; fixed for its whole duration"""
+    submission_id: int
+    exam_room_id: int
+    student_id: int
+    started_at: datetime
+    deadline: datetime
+
+class ActiveSubmissionRegistry:
+    """In-progress attempts by id, filled at start and cleared at submit or auto-submit"""
+
+    def __init__(self, max_entries: int = ACTIVE_SUBMISSIONS_MAX):
+        self.max_entries = max_entries
+        self._entries: Dict[int, ActiveSubmission] = {}
+        self._lock = threading.Lock()
+
+    def put(self, active: ActiveSubmission):
+        with self._lock:
+            self._entries[active.submission_id] = active
+            if len(self._entries) > self.max_entries:
+                now = datetime.utcnow()
+                for submission_id in [key for key, entry in self._entries.items() if entry.deadline < now]:
+                    del self._entries[submission_id]
+
+    def remove(self, submission_id: int):
+        with self._lock:
+            self._entries.pop(submission_id, None)
+
+    def remove_exam_room(self, exam_room_id: int):
+        with self._lock:
+            for submission_id in [key for key, entry in self._entries.items() if entry.exam_room_id == exam_room_id]:
+                del self._entries[submission_id]
+
+    def get(self, db: Session, submission_id: int) -> Optional[ActiveSubmission]:
+        """Active attempt from memory, falling back to one query for attempts started on another worker"""
+        with self._lock:
+            active = self._entries.get(submission_id)
+        if active is not None:
+            return active
+
+        if not use_shard_of(db, submission_id):
+            return None
+        if SHARDED:
+            # The exam room is on the primary, so it cannot be joined
+            row = db.query(Submission.exam_room_id, Submission.student_id, Submission.started_at).filter(
+                Submission.id == submission_id,
+                Submission.status == SubmissionStatus.IN_PROGRESS
+            ).first()
+            if row is not None:
+                duration_minutes = db.query(ExamRoom.duration_minutes).filter(ExamRoom.id == row[0]).scalar()
+                row = None if duration_minutes is None else (*row, duration_minutes)
+        else:
+            row = db.query(
+                Submission.exam_room_id, Submission.student_id, Submission.started_at, ExamRoom.duration_minutes
+            ).join(ExamRoom, ExamRoom.id == Submission.exam_room_id).filter(
+                Submission.id == submission_id,
+                Submission.status == SubmissionStatus.IN_PROGRESS
+            ).first()
+        if row is None:
+            return None
+        exam_room_id, student_id, started_at, duration_minutes = row
+        active = ActiveSubmission(
+            submission_id=submission_id,
+            exam_room_id=exam_room_id,
+            student_id=student_id,
+            started_at=started_at,
+            deadline=started_at + timedelta(minutes=duration_minutes)
+        )
+        self.put(active)
+        return active
+
+    def on_submission_event(self, event):
+        if event.payload["status"] != SubmissionStatus.IN_PROGRESS.value:
+            self.remove(event.payload["submission_id"])
+
+    def on_exam_room_event(self, event):
+        if event.payload.get("deleted"):
+            self.remove_exam_room(event.key)
+
+def auto_submit(db: Session, exam_room_id: int, submission_id: int, started_at: datetime, now: datetime) -> bool:
+    """Close an attempt whose time ran out, unless a concurrent submit got there first; the caller commits"""
+    auto_submitted = update_active_attempt(db, submission_id, {
+        Submission.status: SubmissionStatus.AUTO_SUBMITTED,
+        Submission.submitted_at: now,
+        Submission.time_taken_seconds: int((now - started_at).total_seconds())
+    })
+    if auto_submitted:
+        count_submission_transition(db, exam_room_id, SubmissionStatus.IN_PROGRESS, SubmissionStatus.AUTO_SUBMITTED)
+        publish_submission_event(db, exam_room_id, submission_id, SubmissionStatus.AUTO_SUBMITTED)
+    return bool(auto_submitted)
+
+active_submissions = ActiveSubmissionRegistry()
+bus.subscribe("submission", active_submissions.on_submission_event)
+bus.subscribe("exam_room", active_submissions.on_exam_room_event)
@@ -0,0 +1,322 @@
+"""Cold archival of finished exams.
+
+Exam rooms that ended before a cutoff are written, with their questions,
+options, submissions and answers, to one compressed columnar file per exam
+and then deleted from the hot tables:
+
+    python -m core.archive --before 2025-01-01 [--dry-run]
+
+File layout: ``QARC1\\n``, an 8-byte header length, a JSON header describing
+every column block, then the blocks themselves. Each block is one column
+encoded as a typed array (or JSON for text) and zlib-compressed. Readers
+memory-map the file and only decompress the columns they touch.
+
+History and stats routes merge archived rows in through ``archive_store``.
+"""
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from sqlalchemy import Boolean, DateTime, Integer, LargeBinary
+from sqlalchemy.orm import Session
+from db.db_config import fan_out, use_exam_room_shard
+from models.exam_room import ExamRoom
+from models.question import Question, Option
+from models.submission import Submission, Answer, SubmissionStatus
+from core.invalidation import publish_after_commit
+from core.active_submissions import auto_submit
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+MAGIC = b"QARC1\n"
+NULL_INT = -(2 ** 63)
+EPOCH = datetime(1970, 1, 1)
+
+def _column_kind(column) -> str:
+    if isinstance(column.type, Boolean):
+        return "bool"
+    if isinstance(column.type, Integer):
+        return "int"
+    if isinstance(column.type, DateTime):
+        return "datetime"
+    if isinstance(column.type, LargeBinary):
+        return "blob"
+    return "str"
+
+def _encode_column(kind: str, values: list) -> bytes:
+    if kind in ("int", "bool"):
+        data = array("q", (NULL_INT if value is None else int(value) for value in values)).tobytes()
+    elif kind == "datetime":
+        data = array("q", (
+            NULL_INT if value is None else (value - EPOCH) // timedelta(microseconds=1)
+            for value in values
+        )).tobytes()
+    elif kind == "blob":
+        data = json.dumps([None if value is None else bytes(value).hex() for value in values]).encode()
+    else:
+        data = json.dumps([None if value is None else getattr(value, "value", value) for value in values]).encode()
+    return zlib.compress(data, 6)
+
+def _decode_column(kind: str, block: bytes) -> list:
+    data = zlib.decompress(block)
+    if kind in ("int", "bool", "datetime"):
+        numbers = array("q")
+        numbers.frombytes(data)
+        if kind == "int":
+            return [None if value == NULL_INT else value for value in numbers]
+        if kind == "bool":
+            return [None if value == NULL_INT else bool(value) for value in numbers]
+        return [None if value == NULL_INT else EPOCH + timedelta(microseconds=value) for value in numbers]
+    if kind == "blob":
+        return [None if value is None else bytes.fromhex(value) for value in json.loads(data)]
+    return json.loads(data)
+
+def write_archive(path: str, exam_room: dict, tables: Dict[str, Tuple[List[str], List[str], List[tuple]]]):
+    """Write one exam's tables as compressed columns; tables map name -> (columns, kinds, rows)"""
+    header = {"exam_room": exam_room, "tables": {}}
+    blocks = []
+    offset = 0
+    for table_name, (columns, kinds, rows) in tables.items():
+        table_header = {"rows": len(rows), "columns": {}}
+        for index, (column, kind) in enumerate(zip(columns, kinds)):
+            block = _encode_column(kind, [row[index] for row in rows])
+            table_header["columns"][column] = {"kind": kind, "offset": offset, "length": len(block)}
+            blocks.append(block)
+            offset += len(block)
+        header["tables"][table_name] = table_header
+
+    header_bytes = json.dumps(header, default=str).encode()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers only ever see complete files
+    os.replace(tmp_path, path)
+
+@dataclass(frozen=True)
+class ArchivedSubmission:
+    """Read-only submission row served from an archive file"""
+    id: int
+    exam_room_id: int
+    exam_room_title: str
+    student_id: int
+    started_at: datetime
+    submitted_at: Optional[datetime]
+    status: SubmissionStatus
+    total_score: int
+    time_taken_seconds: Optional[int]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+class ArchiveReader:
+    """Memory-mapped view of one archive file; columns are decompressed on first use"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an exam archive")
+        header_length = struct.unpack_from("<Q", self._mmap, len(MAGIC))[0]
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[header_start:header_start + header_length])
+        self._data_start = header_start + header_length
+        self._columns: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def exam_room(self) -> dict:
+        return self.header["exam_room"]
+
+    def rows(self, table: str) -> int:
+        return self.header["tables"][table]["rows"]
+
+    def column(self, table: str, name: str) -> list:
+        key = (table, name)
+        with self._lock:
+            values = self._columns.get(key)
+            if values is None:
+                spec = self.header["tables"][table]["columns"][name]
+                start = self._data_start + spec["offset"]
+                values = _decode_column(spec["kind"], self._mmap[start:start + spec["length"]])
+                self._columns[key] = values
+            return values
+
+    def close(self):
+        self._mmap.close()
+
+class ArchiveStore:
+    """Indexes every archive file in a directory by student and submission"""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._readers: Dict[str, ArchiveReader] = {}
+        self._by_student: Dict[int, List[Tuple[ArchiveReader, int]]] = {}
+        self._by_submission: Dict[int, Tuple[ArchiveReader, int]] = {}
+        self._scanned_mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if mtime == self._scanned_mtime:
+                return
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".qarc") or name in self._readers:
+                    continue
+                reader = ArchiveReader(os.path.join(self.directory, name))
+                self._readers[name] = reader
+                ids = reader.column("submissions", "id")
+                for row, student_id in enumerate(reader.column("submissions", "student_id")):
+                    self._by_student.setdefault(student_id, []).append((reader, row))
+                    self._by_submission[ids[row]] = (reader, row)
+            self._scanned_mtime = mtime
+
+    def _submission(self, reader: ArchiveReader, row: int) -> ArchivedSubmission:
+        column = lambda name: reader.column("submissions", name)[row]
+        return ArchivedSubmission(
+            id=column("id"),
+            exam_room_id=column("exam_room_id"),
+            exam_room_title=reader.exam_room["title"],
+            student_id=column("student_id"),
+            started_at=column("started_at"),
+            submitted_at=column("submitted_at"),
+            status=SubmissionStatus(column("status")),
+            total_score=column("total_score") or 0,
+            time_taken_seconds=column("time_taken_seconds"),
+            created_at=column("created_at"),
+            updated_at=column("updated_at")
+        )
+
+    def get_submission(self, submission_id: int) -> Optional[ArchivedSubmission]:
+        self._refresh()
+        location = self._by_submission.get(submission_id)
+        return self._submission(*location) if location else None
+
+    def student_submissions(self, student_id: int) -> List[ArchivedSubmission]:
+        self._refresh()
+        return [self._submission(reader, row) for reader, row in self._by_student.get(student_id, [])]
+
+    def totals(self) -> Tuple[int, int]:
+        """Number of archived exam rooms and submissions"""
+        self._refresh()
+        return len(self._readers), len(self._by_submission)
+
+    def submitted_between(self, start: datetime, end: datetime) -> int:
+        self._refresh()
+        count = 0
+        for reader in list(self._readers.values()):
+            count += sum(
+                1 for submitted_at in reader.column("submissions", "submitted_at")
+                if submitted_at is not None and start <= submitted_at < end
+            )
+        return count
+
+archive_store = ArchiveStore()
+
+def _table_rows(db: Session, model, criterion) -> Tuple[List[str], List[str], List[tuple]]:
+    columns = list(model.__table__.columns)
+    rows = db.query(*columns).filter(criterion).order_by(columns[0]).all()
+    return [column.name for column in columns], [_column_kind(column) for column in columns], rows
+
+def archive_exam_room(db: Session, exam_room: ExamRoom, directory: str = ARCHIVE_DIR) -> str:
+    """Write an exam room to its archive file and delete it from the hot tables"""
+    use_exam_room_shard(db, exam_room.id)
+    question_ids = db.query(Question.id).filter(Question.exam_room_id == exam_room.id)
+    submission_ids = db.query(Submission.id).filter(Submission.exam_room_id == exam_room.id)
+    tables = {
+        "questions": _table_rows(db, Question, Question.exam_room_id == exam_room.id),
+        "options": _table_rows(db, Option, Option.question_id.in_(question_ids)),
+        "submissions": _table_rows(db, Submission, Submission.exam_room_id == exam_room.id),
+        "answers": _table_rows(db, Answer, Answer.submission_id.in_(submission_ids)),
+    }
+    metadata = {column.name: getattr(exam_room, column.name) for column in ExamRoom.__table__.columns}
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"exam_{exam_room.id}.qarc")
+    write_archive(path, metadata, tables)
+
+    # The file is durable; now free the hot tables
+    db.query(Answer).filter(Answer.submission_id.in_(submission_ids)).delete(synchronize_session=False)
+    db.query(Submission).filter(Submission.exam_room_id == exam_room.id).delete(synchronize_session=False)
+    db.query(Option).filter(Option.question_id.in_(question_ids)).delete(synchronize_session=False)
+    db.query(Question).filter(Question.exam_room_id == exam_room.id).delete(synchronize_session=False)
+    db.query(ExamRoom).filter(ExamRoom.id == exam_room.id).delete(synchronize_session=False)
+    publish_after_commit(db, "exam_room", exam_room.id, deleted=True)
+    db.commit()
+    return path
+
+def close_expired_attempts(db: Session, exam_rooms: Dict[int, ExamRoom], now: datetime, dry_run: bool = False) -> Set[int]:
+    """Auto-submit abandoned attempts of the given exam rooms; returns the exam rooms with an attempt still live.
+
+    Attempts are otherwise only auto-submitted when their student comes back,
+    so one abandoned attempt would keep its exam out of the archive for good.
+    """
+    in_progress = [
+        row
+        for rows in fan_out(db, lambda session: session.query(
+            Submission.id, Submission.exam_room_id, Submission.started_at
+        ).filter(Submission.status == SubmissionStatus.IN_PROGRESS).all())
+        for row in rows
+    ]
+    live = set()
+    for submission_id, exam_room_id, started_at in in_progress:
+        exam_room = exam_rooms.get(exam_room_id)
+        if exam_room is None:
+            continue
+        if started_at + timedelta(minutes=exam_room.duration_minutes) >= now:
+            live.add(exam_room_id)
+        elif not dry_run:
+            use_exam_room_shard(db, exam_room_id)
+            auto_submit(db, exam_room_id, submission_id, started_at, now)
+    db.commit()
+    return live
+
+def archive_before(db: Session, cutoff: datetime, directory: str = ARCHIVE_DIR, dry_run: bool = False) -> List[int]:
+    """Archive every exam room that ended before cutoff and has no attempt still running"""
+    ended = {
+        exam_room.id: exam_room
+        for exam_room in db.query(ExamRoom).filter(ExamRoom.end_time < cutoff).order_by(ExamRoom.id)
+    }
+    live = close_expired_attempts(db, ended, datetime.utcnow(), dry_run)
+    exam_rooms = [exam_room for exam_room_id, exam_room in ended.items() if exam_room_id not in live]
+
+    archived = []
+    for exam_room in exam_rooms:
+        archived.append(exam_room.id)
+        if not dry_run:
+            archive_exam_room(db, exam_room, directory)
+    return archived
+
+if __name__ == "__main__":
+    from db.db_config import SessionLocal
+    import models  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Move finished exams to compressed archive files")
+    parser.add_argument("--before", required=True, type=datetime.fromisoformat, help="archive exams that ended before this date")
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        archived = archive_before(db, args.before, args.dir, args.dry_run)
+    finally:
+        db.close()
+    action = "Would archive" if args.dry_run else "Archived"
+    print(f"{action} {len(archived)} exam rooms: {archived}")
@@ -54,6 +54,8 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise credentials_exception
+    # Lets the session attribute its writes to this user (read-your-writes routing)
+    db.info["user_id"] = user.id
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import csv
+import io
+import json
+import os
+import threading
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from db.dialects import dialect_insert
+from models.user import User, UserRole
+from schemas.user import UserCreate, BulkRegisterRow, BulkRegisterResponse
+from core.auth import get_password_hash
+
+# bcrypt is CPU bound; hash on every core
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+BULK_REGISTER_MAX_ROWS = int(os.getenv("BULK_REGISTER_MAX_ROWS", "10000"))
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pool_lock = threading.Lock()
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        return _hash_pool
+
+def shutdown_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(cancel_futures=True)
+            _hash_pool = None
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    if len(passwords) <= 1 or HASH_WORKERS <= 1:
+        return [get_password_hash(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    return list(_get_hash_pool().map(get_password_hash, passwords, chunksize=chunksize))
+
+def parse_rows(content_type: str, body: bytes) -> List[dict]:
+    """Rows from a CSV file with a header line, or a JSON list (optionally under "users")"""
+    if "csv" in content_type:
+        return list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get("users")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of users")
+    return data
+
+def bulk_register(db: Session, rows: List[dict]) -> BulkRegisterResponse:
+    results = [BulkRegisterRow(row=index + 1, status="pending") for index in range(len(rows))]
+    valid: Dict[str, int] = {}
+    users: Dict[int, UserCreate] = {}
+
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index].status = "invalid"
+            results[index].detail = "Row must be an object"
+            continue
+        # CSV cells are strings; empty role means the default
+        row = {key: value for key, value in row.items() if key and value not in (None, "")}
+        results[index].email = row.get("email")
+        try:
+            user = UserCreate(**row)
+        except ValidationError as exc:
+            results[index].status = "invalid"
+            results[index].detail = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+            )
+            continue
+        email = user.email
+        results[index].email = email
+        if email in valid:
+            results[index].status = "duplicate"
+            results[index].detail = f"Same email as row {valid[email] + 1}"
+            continue
+        valid[email] = index
+        users[index] = user
+
+    # One round trip for every existing email
+    existing = db.query(User.email).filter(User.email.in_(list(valid))).all() if valid else []
+    for (email,) in existing:
+        index = valid.pop(email)
+        results[index].status = "duplicate"
+        results[index].detail = "Email already registered"
+
+    pending = list(valid.values())
+    hashes = hash_passwords([users[index].password for index in pending])
+
+    values = [
+        {
+            "username": users[index].username,
+            "email": results[index].email,
+            "password_hash": password_hash,
+            "role": users[index].role or UserRole.STUDENT
+        }
+        for index, password_hash in zip(pending, hashes)
+    ]
+    created_ids: Dict[str, int] = {}
+    for start in range(0, len(values), BULK_INSERT_CHUNK_SIZE):
+        # Emails registered concurrently since the check are skipped rather than failing the batch
+        statement = dialect_insert(db, User).on_conflict_do_nothing(
+            index_elements=[User.email]
+        ).returning(User.id, User.email)
+        for user_id, email in db.execute(statement, values[start:start + BULK_INSERT_CHUNK_SIZE]):
+            created_ids[email] = user_id
+    db.commit()
+
+    for index in pending:
+        user_id = created_ids.get(results[index].email)
+        if user_id is None:
+            results[index].status = "duplicate"
+            results[index].detail = "Email already registered"
+        else:
+            results[index].status = "created"
+            results[index].id = user_id
+
+    created = len(created_ids)
+    return BulkRegisterResponse(created=created, failed=len(rows) - created, rows=results)
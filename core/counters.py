@@ -0,0 +1,126 @@
+"""Denormalized exam room counters.
+
+``question_count``, ``total_marks`` and the per-status submission counts on
+``exam_rooms`` are adjusted in the same transaction as the question or
+submission write that changes them, so listings read them with the exam row.
+Anything that drifts (manual SQL, a crash between statements of an old
+build, a failure between the shard and primary commits) is repaired by:
+
+    python -m core.counters [--dry-run]
+"""
+from typing import Dict, List, Optional
+import argparse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from db.db_config import fan_out
+from models.exam_room import ExamRoom
+from models.question import Question
+from models.submission import Submission, SubmissionStatus
+from core.jobs import JobContext, job_handler
+
+STATUS_COUNTERS = {
+    SubmissionStatus.IN_PROGRESS: ExamRoom.in_progress_count,
+    SubmissionStatus.SUBMITTED: ExamRoom.submitted_count,
+    SubmissionStatus.AUTO_SUBMITTED: ExamRoom.auto_submitted_count,
+}
+
+COUNTER_COLUMNS = [
+    ExamRoom.question_count, ExamRoom.total_marks,
+    ExamRoom.in_progress_count, ExamRoom.submitted_count, ExamRoom.auto_submitted_count,
+]
+
+def adjust_counters(db: Session, exam_room_id: int, deltas: Dict):
+    """Add deltas ({column: amount}) to an exam room's counters; caller commits"""
+    values = {column: column + amount for column, amount in deltas.items() if amount}
+    if not values:
+        return
+    # Counters are not an edit of the exam itself
+    values[ExamRoom.updated_at] = ExamRoom.updated_at
+    db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).update(values, synchronize_session=False)
+
+def count_question(db: Session, exam_room_id: int, marks: int, count: int = 1):
+    """Questions added (count=1) or removed (count=-1) with the given marks"""
+    adjust_counters(db, exam_room_id, {ExamRoom.question_count: count, ExamRoom.total_marks: count * (marks or 0)})
+
+def count_submission_transition(
+    db: Session,
+    exam_room_id: int,
+    previous: Optional[SubmissionStatus],
+    status: Optional[SubmissionStatus]
+):
+    """A submission moved between statuses; None means created or deleted"""
+    deltas = {}
+    if previous is not None:
+        deltas[STATUS_COUNTERS[SubmissionStatus(previous)]] = -1
+    if status is not None:
+        column = STATUS_COUNTERS[SubmissionStatus(status)]
+        deltas[column] = deltas.get(column, 0) + 1
+    adjust_counters(db, exam_room_id, deltas)
+
+def uncount_submissions(db: Session, *criterion):
+    """Remove submissions matching criterion from their exam rooms' counters, before deleting them"""
+    per_shard = fan_out(db, lambda session: session.query(
+        Submission.exam_room_id, Submission.status, func.count(Submission.id)
+    ).filter(*criterion).group_by(Submission.exam_room_id, Submission.status).all())
+    for exam_room_id, submission_status, count in (row for rows in per_shard for row in rows):
+        adjust_counters(db, exam_room_id, {STATUS_COUNTERS[SubmissionStatus(submission_status)]: -count})
+
+def actual_counters(db: Session) -> Dict[int, Dict[str, int]]:
+    """Counters recomputed from the questions and submissions tables"""
+    actual = {
+        exam_room_id: {column.key: 0 for column in COUNTER_COLUMNS}
+        for (exam_room_id,) in db.query(ExamRoom.id)
+    }
+    # Each exam room's rows live on a single shard, so per-shard groups never overlap
+    questions = fan_out(db, lambda session: session.query(
+        Question.exam_room_id, func.count(Question.id), func.coalesce(func.sum(Question.marks), 0)
+    ).group_by(Question.exam_room_id).all())
+    for exam_room_id, count, marks in (row for rows in questions for row in rows):
+        if exam_room_id in actual:
+            actual[exam_room_id]["question_count"] = count
+            actual[exam_room_id]["total_marks"] = marks
+    submissions = fan_out(db, lambda session: session.query(
+        Submission.exam_room_id, Submission.status, func.count(Submission.id)
+    ).group_by(Submission.exam_room_id, Submission.status).all())
+    for exam_room_id, submission_status, count in (row for rows in submissions for row in rows):
+        if exam_room_id in actual:
+            actual[exam_room_id][STATUS_COUNTERS[SubmissionStatus(submission_status)].key] = count
+    return actual
+
+def reconcile_counters(db: Session, dry_run: bool = False) -> List[int]:
+    """Rewrite counters that differ from the source tables; returns the exam rooms that drifted"""
+    actual = actual_counters(db)
+    drifted = []
+    for exam_room_id, *stored in db.query(ExamRoom.id, *COUNTER_COLUMNS).order_by(ExamRoom.id):
+        expected = actual.get(exam_room_id)
+        if expected is None:
+            continue
+        if [value or 0 for value in stored] == [expected[column.key] for column in COUNTER_COLUMNS]:
+            continue
+        drifted.append(exam_room_id)
+        if not dry_run:
+            values = {column: expected[column.key] for column in COUNTER_COLUMNS}
+            values[ExamRoom.updated_at] = ExamRoom.updated_at
+            db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).update(values, synchronize_session=False)
+    db.commit()
+    return drifted
+
+@job_handler("reconcile_counters")
+def run_reconcile_counters(db: Session, job: JobContext) -> dict:
+    return {"drifted": reconcile_counters(db)}
+
+if __name__ == "__main__":
+    from db.db_config import SessionLocal
+    import models  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Recompute denormalized exam room counters")
+    parser.add_argument("--dry-run", action="store_true", help="report drift without fixing it")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drifted = reconcile_counters(db, args.dry_run)
+    finally:
+        db.close()
+    action = "Found" if args.dry_run else "Fixed"
+    print(f"{action} drifted counters on {len(drifted)} exam rooms: {drifted}")
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from models.exam_room import ExamRoom
+from core.invalidation import bus
+
+# Safety net for deployments without a cross-worker invalidation backend
+EXAM_CACHE_TTL_SECONDS = int(os.getenv("EXAM_CACHE_TTL_SECONDS", "300"))
+
+@dataclass(frozen=True)
+class ExamRoomInfo:
+    """Detached copy of the exam room fields the hot paths need"""
+    id: int
+    title: str
+    created_by: int
+    start_time: datetime
+    end_time: datetime
+    duration_minutes: int
+    is_published: bool
+    content_version: int
+    packed_answers: bool
+
+    @classmethod
+    def from_model(cls, exam_room: ExamRoom) -> "ExamRoomInfo":
+        return cls(
+            id=exam_room.id,
+            title=exam_room.title,
+            created_by=exam_room.created_by,
+            start_time=exam_room.start_time,
+            end_time=exam_room.end_time,
+            duration_minutes=exam_room.duration_minutes,
+            is_published=bool(exam_room.is_published),
+            content_version=exam_room.content_version,
+            packed_answers=bool(exam_room.packed_answers)
+        )
+
+class ExamRoomCache:
+    """Exam room metadata by id, dropped on every exam_room invalidation event"""
+
+    def __init__(self, ttl_seconds: int = EXAM_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[float, ExamRoomInfo]] = {}
+        # Bumped per exam on invalidation so a load racing with a write is not cached
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, exam_room_id: int) -> Optional[ExamRoomInfo]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(exam_room_id)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self._generations.get(exam_room_id, 0)
+
+        exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+        if exam_room is None:
+            return None
+        info = ExamRoomInfo.from_model(exam_room)
+        with self._lock:
+            if self._generations.get(exam_room_id, 0) == generation:
+                self._entries[exam_room_id] = (now + self.ttl_seconds, info)
+        return info
+
+    def invalidate(self, exam_room_id: int):
+        with self._lock:
+            self._entries.pop(exam_room_id, None)
+            self._generations[exam_room_id] = self._generations.get(exam_room_id, 0) + 1
+
+exam_room_cache = ExamRoomCache()
+bus.subscribe("exam_room", lambda event: exam_room_cache.invalidate(event.key))
@@ -0,0 +1,141 @@
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+import logging
+import os
+import time
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.orm import Session
+from db.db_config import use_exam_room_shard
+from models.question import Question, Option
+from models.submission import Submission, Answer, SubmissionStatus
+from core.packed_answers import build_paper_layout, grade_packed
+from core.live_stats import publish_submission_event
+from core.jobs import JobContext, enqueue, job_handler
+
+logger = logging.getLogger(__name__)
+
+# Packed submissions graded per round trip during a regrade
+REGRADE_BATCH_SIZE = int(os.getenv("REGRADE_BATCH_SIZE", "1000"))
+
+@dataclass
+class AnswerKey:
+    """Correct answers and marks for one content version of an exam"""
+    # question_id -> {option_id: is_correct}
+    options: Dict[int, Dict[int, bool]] = field(default_factory=dict)
+    # question_id -> marks
+    marks: Dict[int, int] = field(default_factory=dict)
+    # question_id -> correct option_id
+    correct: Dict[int, Optional[int]] = field(default_factory=dict)
+
+def build_answer_key(db: Session, exam_room_id: int) -> AnswerKey:
+    answer_key = AnswerKey()
+    use_exam_room_shard(db, exam_room_id)
+    rows = db.query(Question.id, Question.marks, Option.id, Option.is_correct).outerjoin(
+        Option, Option.question_id == Question.id
+    ).filter(Question.exam_room_id == exam_room_id).all()
+
+    for question_id, marks, option_id, is_correct in rows:
+        answer_key.options.setdefault(question_id, {})
+        answer_key.marks[question_id] = marks or 0
+        answer_key.correct.setdefault(question_id, None)
+        if option_id is not None:
+            answer_key.options[question_id][option_id] = bool(is_correct)
+            if is_correct and answer_key.correct[question_id] is None:
+                answer_key.correct[question_id] = option_id
+    return answer_key
+
+@dataclass
+class RegradeResult:
+    exam_room_id: int
+    answers_changed: int = 0
+    submissions_changed: int = 0
+    elapsed_seconds: float = 0.0
+
+def regrade_exam_room(db: Session, exam_room_id: int, batch_size: int = REGRADE_BATCH_SIZE) -> RegradeResult:
+    """Recompute answers.is_correct and finished submissions' total_score against the current key.
+
+    Row-per-answer submissions are regraded with two set-based UPDATEs; packed
+    submissions are graded in memory and written back in batches. Only rows
+    whose values change are written.
+    """
+    start = time.perf_counter()
+    result = RegradeResult(exam_room_id=exam_room_id)
+    use_exam_room_shard(db, exam_room_id)
+    exam_submissions = select(Submission.id).where(Submission.exam_room_id == exam_room_id)
+
+    is_correct = exists().where(Option.id == Answer.selected_option_id, Option.is_correct == True)
+    result.answers_changed = db.execute(
+        update(Answer).where(
+            Answer.submission_id.in_(exam_submissions),
+            func.coalesce(Answer.is_correct, False) != is_correct
+        ).values(is_correct=is_correct).execution_options(synchronize_session=False)
+    ).rowcount
+
+    score = func.coalesce(
+        select(func.sum(Question.marks)).join(Answer, Answer.question_id == Question.id).where(
+            Answer.submission_id == Submission.id,
+            Answer.is_correct == True
+        ).scalar_subquery(),
+        0
+    )
+    finished = [
+        Submission.exam_room_id == exam_room_id,
+        Submission.status != SubmissionStatus.IN_PROGRESS,
+    ]
+    changed = db.execute(
+        update(Submission).where(
+            *finished,
+            Submission.packed_answers.is_(None),
+            func.coalesce(Submission.total_score, 0) != score
+        ).values(total_score=score).returning(
+            Submission.id, Submission.status, Submission.total_score
+        ).execution_options(synchronize_session=False)
+    ).all()
+
+    packed = db.query(Submission.id).filter(*finished, Submission.packed_answers.isnot(None)).first()
+    if packed is not None:
+        layout = build_paper_layout(db, exam_room_id)
+        last_id = 0
+        while True:
+            rows = db.query(
+                Submission.id, Submission.status, Submission.total_score, Submission.packed_answers
+            ).filter(
+                *finished, Submission.packed_answers.isnot(None), Submission.id > last_id
+            ).order_by(Submission.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = []
+            for submission_id, submission_status, total_score, packed_answers in rows:
+                new_score, _ = grade_packed(layout, packed_answers)
+                if new_score != (total_score or 0):
+                    updates.append({"id": submission_id, "total_score": new_score})
+                    changed.append((submission_id, submission_status, new_score))
+            if updates:
+                db.execute(update(Submission), updates)
+
+    # Live score histograms follow the corrected scores
+    for submission_id, submission_status, total_score in changed:
+        publish_submission_event(db, exam_room_id, submission_id, submission_status, total_score)
+    db.commit()
+    result.submissions_changed = len(changed)
+    result.elapsed_seconds = round(time.perf_counter() - start, 3)
+    logger.info(
+        f"Regraded exam room {exam_room_id}: {result.answers_changed} answers and "
+        f"{result.submissions_changed} submissions changed in {result.elapsed_seconds}s"
+    )
+    return result
+
+def queue_regrade(db: Session, exam_room_id: int, created_by: Optional[int] = None):
+    """Queue a regrade in the caller's transaction if the exam has attempts to regrade"""
+    use_exam_room_shard(db, exam_room_id)
+    if db.query(Submission.id).filter(Submission.exam_room_id == exam_room_id).first() is None:
+        return None
+    return enqueue(
+        db, "regrade", {"exam_room_id": exam_room_id},
+        key=f"exam_room:{exam_room_id}", created_by=created_by
+    )
+
+@job_handler("regrade")
+def run_regrade(db: Session, job: JobContext, exam_room_id: int) -> dict:
+    return asdict(regrade_exam_room(db, exam_room_id))
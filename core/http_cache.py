@@ -0,0 +1,46 @@
+from typing import Optional
+import os
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from models.exam_room import ExamRoom
+from core.invalidation import publish_after_commit
+
+# Published exams rarely change, so clients may reuse them briefly before revalidating
+PUBLISHED_EXAM_MAX_AGE = int(os.getenv("PUBLISHED_EXAM_MAX_AGE", "30"))
+
+def exam_etag(kind: str, exam_room: ExamRoom) -> str:
+    """Strong ETag for a representation of an exam room at its current content version"""
+    return f'"{kind}-{exam_room.id}-v{exam_room.content_version}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match: Optional[str] = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function; encoded variants share the content version
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return any(tag == etag or tag == etag[:-1] + '-gzip"' for tag in candidates)
+
+def exam_cache_control(exam_room: ExamRoom) -> str:
+    if exam_room.is_published:
+        return f"private, max-age={PUBLISHED_EXAM_MAX_AGE}, must-revalidate"
+    # Drafts are being edited, always revalidate
+    return "private, no-cache"
+
+def set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status_code=304, headers={"Vary": "Accept-Encoding"})
+    set_cache_headers(response, etag, cache_control)
+    return response
+
+def bump_content_version(db: Session, exam_room_id: int):
+    """Invalidate cached representations of an exam; caller commits"""
+    db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).update(
+        {ExamRoom.content_version: ExamRoom.content_version + 1},
+        synchronize_session=False
+    )
+    publish_after_commit(db, "exam_room", exam_room_id)
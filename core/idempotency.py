@@ -0,0 +1,90 @@
+"""Idempotency-Key handling for autosaves.
+
+A keyed request's result is written to idempotency_keys in the same
+transaction as the write it describes, so a retry is replayed whichever
+worker it lands on, and a request that failed leaves no key behind. Recent
+results are also kept in memory so a retry on the same worker skips the
+query. Expired keys are removed with:
+
+    python -m core.idempotency
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from repositories.idempotency import get_idempotency_key, save_idempotency_key, delete_idempotency_keys_before
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+
+class IdempotencyStore:
+    """Remembers the result of a keyed request so client retries replay it instead of re-applying it"""
+
+    def __init__(self, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        # In-memory copies of recent results, in front of the table
+        self._entries: "OrderedDict[tuple[int, str], tuple[float, str, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, submission_id: int, user_id: int, key: str, fingerprint: str) -> Optional[dict]:
+        """Stored result for this key, or None. Raises ValueError if the key was used for a different request"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[0] < now:
+                del self._entries[(user_id, key)]
+                entry = None
+        if entry is not None:
+            _, stored_fingerprint, result = entry
+        else:
+            row = get_idempotency_key(
+                db, submission_id, user_id, key, datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+            )
+            if row is None:
+                return None
+            stored_fingerprint, result = row.fingerprint, row.result
+            self._remember(user_id, key, stored_fingerprint, result)
+        if stored_fingerprint != fingerprint:
+            raise ValueError("Idempotency-Key was already used for a different request")
+        return result
+
+    def record(self, db: Session, submission_id: int, user_id: int, key: str, fingerprint: str, result: dict):
+        """Store a result in the transaction of the write it describes; it is only kept if that commits"""
+        save_idempotency_key(db, submission_id, user_id, key, fingerprint, result)
+
+    def put(self, user_id: int, key: str, fingerprint: str, result: dict):
+        """Keep a committed result in memory for retries on this worker"""
+        self._remember(user_id, key, fingerprint, result)
+
+    def _remember(self, user_id: int, key: str, fingerprint: str, result: dict):
+        with self._lock:
+            self._entries[(user_id, key)] = (time.monotonic() + self.ttl_seconds, fingerprint, result)
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+idempotency_store = IdempotencyStore()
+
+def purge_expired_keys(db: Session, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS) -> int:
+    deleted = delete_idempotency_keys_before(db, datetime.utcnow() - timedelta(seconds=ttl_seconds))
+    db.commit()
+    return deleted
+
+if __name__ == "__main__":
+    from db.db_config import SessionLocal
+    import models  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Delete expired idempotency keys")
+    parser.add_argument("--ttl", type=int, default=IDEMPOTENCY_TTL_SECONDS, help="seconds a key is kept")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"Deleted {purge_expired_keys(db, args.ttl)} expired idempotency keys")
+    finally:
+        db.close()
@@ -0,0 +1,268 @@
+"""Cross-worker cache invalidation.
+
+Each uvicorn worker keeps its own in-process caches. Writes publish an
+InvalidationEvent after their transaction commits; the bus delivers it to
+local subscribers immediately and broadcasts it to every other worker:
+
+* ``postgres`` - LISTEN/NOTIFY on a dedicated connection
+* ``unix``     - datagram sockets in a shared directory (single host, tests)
+* ``local``    - this process only
+"""
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import os
+import select
+import socket
+import tempfile
+import threading
+import uuid
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_BACKEND = os.getenv("INVALIDATION_BACKEND")
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "quiz_invalidation")
+# Defaults to a directory per database (see socket_dir), so unrelated deployments
+# and test runs on one host never share it
+INVALIDATION_SOCKET_DIR = os.getenv("INVALIDATION_SOCKET_DIR")
+# Recently received (origin, seq) pairs remembered to drop redelivered events
+INVALIDATION_DEDUP_WINDOW = int(os.getenv("INVALIDATION_DEDUP_WINDOW", "10000"))
+
+@dataclass
+class InvalidationEvent:
+    kind: str
+    key: int
+    payload: dict = field(default_factory=dict)
+    origin: str = ""
+    # Per-origin sequence number, lets receivers drop duplicates
+    seq: int = 0
+
+    def encode(self) -> bytes:
+        return json.dumps(asdict(self)).encode()
+
+    @classmethod
+    def decode(cls, data: bytes) -> "InvalidationEvent":
+        # Unknown fields are ignored, so workers on different releases can share a channel
+        return cls(**{name: value for name, value in json.loads(data).items() if name in cls.__dataclass_fields__})
+
+class LocalBackend:
+    """Delivers events to this process only"""
+
+    def start(self, deliver: Callable[[bytes], None]):
+        pass
+
+    def broadcast(self, data: bytes):
+        pass
+
+    def stop(self):
+        pass
+
+class UnixSocketBackend:
+    """One datagram socket per worker in a shared directory; broadcast sends to every peer"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self.sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self, deliver: Callable[[bytes], None]):
+        os.makedirs(self.directory, exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.sock.settimeout(1.0)
+
+        def listen():
+            while not self._stopped.is_set():
+                try:
+                    data = self.sock.recv(65536)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                deliver(data)
+
+        self._thread = threading.Thread(target=listen, name="invalidation-unix", daemon=True)
+        self._thread.start()
+
+    def broadcast(self, data: bytes):
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for peer in glob.glob(os.path.join(self.directory, "*.sock")):
+                if peer == self.path:
+                    continue
+                try:
+                    sender.sendto(data, peer)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The worker behind this socket is gone
+                    try:
+                        os.unlink(peer)
+                    except OSError:
+                        pass
+                except OSError as exc:
+                    logger.warning(f"Invalidation broadcast to {peer} failed: {exc}")
+        finally:
+            sender.close()
+
+    def stop(self):
+        self._stopped.set()
+        if self.sock is not None:
+            self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+class PostgresBackend:
+    """LISTEN/NOTIFY on a connection held outside the pool"""
+
+    def __init__(self, engine: Engine, channel: str = INVALIDATION_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._conn = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self, deliver: Callable[[bytes], None]):
+        raw = self.engine.raw_connection()
+        raw.detach()
+        self._conn = raw.driver_connection
+        self._conn.autocommit = True
+        with self._conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+
+        def listen():
+            while not self._stopped.is_set():
+                try:
+                    ready, _, _ = select.select([self._conn], [], [], 1.0)
+                    if not ready:
+                        continue
+                    self._conn.poll()
+                except Exception as exc:
+                    logger.error(f"Invalidation listener stopped: {exc}")
+                    break
+                while self._conn.notifies:
+                    notify = self._conn.notifies.pop(0)
+                    deliver(notify.payload.encode())
+
+        self._thread = threading.Thread(target=listen, name="invalidation-pg", daemon=True)
+        self._thread.start()
+
+    def broadcast(self, data: bytes):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {
+                "channel": self.channel,
+                "payload": data.decode()
+            })
+            conn.commit()
+
+    def stop(self):
+        self._stopped.set()
+        if self._conn is not None:
+            self._conn.close()
+
+class InvalidationBus:
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.backend = LocalBackend()
+        self._subscribers: Dict[str, List[Callable[[InvalidationEvent], None]]] = defaultdict(list)
+        self._seq = itertools.count(1)
+        # Events from concurrent commits may arrive out of order, so only exact repeats are dropped
+        self._seen: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def subscribe(self, kind: str, callback: Callable[[InvalidationEvent], None]):
+        self._subscribers[kind].append(callback)
+
+    def start(self, backend):
+        self.backend = backend
+        backend.start(self._receive)
+
+    def stop(self):
+        self.backend.stop()
+        self.backend = LocalBackend()
+
+    def publish(self, kind: str, key: int, **payload):
+        event = InvalidationEvent(
+            kind=kind, key=key, payload=payload,
+            origin=self.origin, seq=next(self._seq)
+        )
+        self._dispatch(event)
+        try:
+            self.backend.broadcast(event.encode())
+        except Exception as exc:
+            # Peers fall back to their rebuild intervals and version checks; never fail the write
+            logger.error(f"Invalidation broadcast failed: {exc}")
+
+    def _receive(self, data: bytes):
+        try:
+            event = InvalidationEvent.decode(data)
+        except (ValueError, TypeError) as exc:
+            logger.warning(f"Ignoring malformed invalidation event: {exc}")
+            return
+        if event.origin == self.origin:
+            return
+        with self._lock:
+            seen = (event.origin, event.seq)
+            if seen in self._seen:
+                return
+            self._seen[seen] = None
+            if len(self._seen) > INVALIDATION_DEDUP_WINDOW:
+                self._seen.popitem(last=False)
+        self._dispatch(event)
+
+    def _dispatch(self, event: InvalidationEvent):
+        for callback in self._subscribers.get(event.kind, []):
+            try:
+                callback(event)
+            except Exception as exc:
+                logger.error(f"Invalidation subscriber for {event.kind} failed: {exc}")
+
+bus = InvalidationBus()
+
+def socket_dir(engine: Engine) -> str:
+    """INVALIDATION_SOCKET_DIR, or a directory derived from the database the workers share"""
+    if INVALIDATION_SOCKET_DIR:
+        return INVALIDATION_SOCKET_DIR
+    digest = hashlib.sha1(engine.url.render_as_string(hide_password=False).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"quiz-invalidation-{digest}")
+
+def create_backend(engine: Engine, name: Optional[str] = INVALIDATION_BACKEND):
+    if name is None:
+        if engine.dialect.name == "postgresql":
+            name = "postgres"
+        elif hasattr(socket, "AF_UNIX"):
+            name = "unix"
+        else:
+            name = "local"
+    if name == "postgres":
+        return PostgresBackend(engine)
+    if name == "unix":
+        return UnixSocketBackend(socket_dir(engine))
+    return LocalBackend()
+
+def publish_after_commit(db: Session, kind: str, key: int, **payload):
+    """Queue an invalidation that is only published if the session's transaction commits.
+
+    Events only tell subscribers to drop or re-read the key, never carry its
+    new state, so one arriving late or out of order cannot restore stale data.
+    """
+    db.info.setdefault("pending_invalidations", []).append((kind, key, payload))
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session):
+    for kind, key, payload in session.info.pop("pending_invalidations", []):
+        bus.publish(kind, key, **payload)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop("pending_invalidations", None)
@@ -0,0 +1,257 @@
+"""Persistent background jobs.
+
+Heavy admin work is queued as a row in ``jobs`` and the request returns the
+job id. Every app process runs a small worker pool that claims pending jobs
+(``FOR UPDATE SKIP LOCKED`` on Postgres, a conditional UPDATE on SQLite),
+runs the registered handler and records progress and the result.
+
+Running jobs are heartbeated by their worker. A job whose heartbeat stops,
+because its process died or restarted, goes back to pending and is picked
+up again, so handlers must be safe to run more than once.
+
+    @job_handler("regrade")
+    def run_regrade(db, job, exam_room_id):
+        ...
+        job.progress(done, total)
+        return {...}  # stored as the job result
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from db.db_config import SessionLocal
+from models.job import Job, JobStatus
+from core.invalidation import bus, publish_after_commit
+
+logger = logging.getLogger(__name__)
+
+# Jobs run concurrently per process; 0 leaves this process web-only
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Idle polling interval; new jobs also wake workers through the invalidation bus
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+# Running jobs without a heartbeat for this long are considered abandoned
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+JobHandler = Callable[..., Optional[dict]]
+HANDLERS: Dict[str, JobHandler] = {}
+
+def job_handler(kind: str):
+    def register(handler: JobHandler) -> JobHandler:
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+def enqueue(db: Session, kind: str, params: Optional[dict] = None, key: Optional[str] = None, created_by: Optional[int] = None) -> Job:
+    """Queue a job in the caller's transaction; it becomes visible to workers when the caller commits.
+
+    With a key, a job of the same kind and key that has not started yet is reused.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind}")
+    if key is not None:
+        pending = db.query(Job).filter(
+            Job.kind == kind, Job.key == key, Job.status == JobStatus.PENDING
+        ).first()
+        if pending is not None:
+            return pending
+    job = Job(kind=kind, key=key, params=params or {}, status=JobStatus.PENDING, created_by=created_by)
+    db.add(job)
+    db.flush()
+    publish_after_commit(db, "job", job.id)
+    return job
+
+class JobContext:
+    """Handed to handlers for progress reporting"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._last_report = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None, force: bool = False):
+        # Written in its own short transaction, at most once a second
+        now = time.monotonic()
+        if not force and now - self._last_report < 1.0:
+            return
+        self._last_report = now
+        db = SessionLocal()
+        try:
+            values = {Job.progress: done, Job.heartbeat_at: datetime.utcnow()}
+            if total is not None:
+                values[Job.total] = total
+            db.query(Job).filter(Job.id == self.job_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+class JobWorker:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._running: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.workers <= 0 or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._thread = threading.Thread(target=self._loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        # Jobs still running are picked up again once their heartbeat goes stale
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        last_maintenance = 0.0
+        while not self._stopped.is_set():
+            try:
+                if time.monotonic() - last_maintenance >= JOB_HEARTBEAT_SECONDS:
+                    self._heartbeat()
+                    requeue_stale_jobs()
+                    last_maintenance = time.monotonic()
+                while len(self._running) < self.workers:
+                    job_id = claim_job(self.name)
+                    if job_id is None:
+                        break
+                    with self._lock:
+                        self._running.add(job_id)
+                    self._executor.submit(self._run, job_id)
+            except Exception as exc:
+                logger.error(f"Job dispatcher error: {exc}")
+            self._wake.wait(JOB_POLL_SECONDS)
+            self._wake.clear()
+
+    def _heartbeat(self):
+        with self._lock:
+            running = list(self._running)
+        if not running:
+            return
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id.in_(running), Job.worker == self.name).update(
+                {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self, job_id: int):
+        try:
+            run_job(job_id, self.name)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+            # A slot is free
+            self._wake.set()
+
+job_worker = JobWorker()
+bus.subscribe("job", lambda event: job_worker.wake())
+
+def claim_job(worker: str) -> Optional[int]:
+    """Atomically move the oldest pending job to RUNNING for this worker"""
+    db = SessionLocal()
+    try:
+        while True:
+            # SKIP LOCKED on Postgres; SQLite ignores the lock and relies on the guarded UPDATE below
+            candidate = db.query(Job.id).filter(Job.status == JobStatus.PENDING).order_by(Job.id).with_for_update(
+                skip_locked=True
+            ).first()
+            if candidate is None:
+                db.rollback()
+                return None
+            now = datetime.utcnow()
+            claimed = db.query(Job).filter(Job.id == candidate.id, Job.status == JobStatus.PENDING).update({
+                Job.status: JobStatus.RUNNING,
+                Job.worker: worker,
+                Job.attempts: Job.attempts + 1,
+                Job.started_at: now,
+                Job.heartbeat_at: now
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return candidate.id
+    finally:
+        db.close()
+
+def run_job(job_id: int, worker: str):
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        handler = HANDLERS.get(job.kind)
+        kind, params = job.kind, dict(job.params or {})
+        db.commit()
+        start = time.perf_counter()
+        if handler is None:
+            raise ValueError(f"No handler for job kind {kind}")
+        result = handler(db, JobContext(job_id), **params)
+        db.commit()
+        finished = {
+            Job.status: JobStatus.SUCCEEDED,
+            Job.progress: func.coalesce(Job.total, Job.progress),
+            Job.result: result,
+            Job.error: None,
+            Job.finished_at: datetime.utcnow()
+        }
+        logger.info(f"Job {job_id} ({kind}) succeeded in {time.perf_counter() - start:.2f}s")
+    except Exception as exc:
+        db.rollback()
+        logger.error(f"Job {job_id} failed: {exc}\n{traceback.format_exc()}")
+        finished = {
+            Job.status: JobStatus.FAILED,
+            Job.error: str(exc)[:2000],
+            Job.finished_at: datetime.utcnow()
+        }
+    try:
+        # Only the worker that still owns the job records the outcome
+        db.query(Job).filter(Job.id == job_id, Job.worker == worker).update(finished, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def requeue_stale_jobs() -> int:
+    """Return abandoned running jobs to the queue, or fail them after JOB_MAX_ATTEMPTS"""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        stale = [Job.status == JobStatus.RUNNING, Job.heartbeat_at < cutoff]
+        failed = db.query(Job).filter(*stale, Job.attempts >= JOB_MAX_ATTEMPTS).update({
+            Job.status: JobStatus.FAILED,
+            Job.error: "Abandoned by its worker too many times",
+            Job.worker: None,
+            Job.finished_at: datetime.utcnow()
+        }, synchronize_session=False)
+        requeued = db.query(Job).filter(*stale).update({
+            Job.status: JobStatus.PENDING,
+            Job.worker: None
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    if requeued or failed:
+        logger.warning(f"Requeued {requeued} and failed {failed} abandoned jobs")
+    return requeued
@@ -0,0 +1,137 @@
+from collections import Counter
+from typing import Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from db.db_config import ReadSessionLocal, use_exam_room_shard
+from models.submission import Submission, SubmissionStatus
+from core.invalidation import bus, publish_after_commit
+
+# Seconds between re-reads of a watched exam's submissions, which repair any
+# submission event the bus dropped
+LIVE_STATS_RESYNC_SECONDS = float(os.getenv("LIVE_STATS_RESYNC_SECONDS", "60"))
+
+class ExamLiveStats:
+    """Live aggregates for one exam room, maintained from submission events"""
+
+    def __init__(self, exam_room_id: int):
+        self.exam_room_id = exam_room_id
+        self.counts: Counter = Counter()
+        self.scores: Counter = Counter()
+        self.version = 0
+        # submission_id -> (status, score); lets repeated or reordered events apply idempotently
+        self._states: Dict[int, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        self._payload: Optional[str] = None
+        self._payload_version = -1
+        # Monotonic time of the last read of the submissions table; None until seeded
+        self.loaded_at: Optional[float] = None
+
+    def apply(self, submission_id: int, status: str, score: int = 0, seed: bool = False):
+        with self._lock:
+            previous = self._states.get(submission_id)
+            if previous is not None:
+                # Seed rows may be older than events already applied; finished attempts never reopen
+                reopened = previous[0] != SubmissionStatus.IN_PROGRESS.value and status == SubmissionStatus.IN_PROGRESS.value
+                if seed or reopened:
+                    return
+                if previous == (status, score):
+                    return
+                self._remove(previous)
+            self._states[submission_id] = (status, score)
+            self.counts[status] += 1
+            if status != SubmissionStatus.IN_PROGRESS.value:
+                self.scores[score] += 1
+            self.version += 1
+
+    def due(self, resync_seconds: float = LIVE_STATS_RESYNC_SECONDS) -> bool:
+        """Whether the aggregates are unseeded or older than resync_seconds"""
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= resync_seconds
+
+    def _remove(self, state: Tuple[str, int]):
+        status, score = state
+        self.counts[status] -= 1
+        if status != SubmissionStatus.IN_PROGRESS.value:
+            self.scores[score] -= 1
+            if self.scores[score] == 0:
+                del self.scores[score]
+
+    def payload(self) -> str:
+        """JSON aggregate for the current version, serialized once and shared by every watcher"""
+        with self._lock:
+            if self._payload_version != self.version:
+                self._payload = json.dumps({
+                    "exam_room_id": self.exam_room_id,
+                    "version": self.version,
+                    "in_progress": self.counts[SubmissionStatus.IN_PROGRESS.value],
+                    "submitted": self.counts[SubmissionStatus.SUBMITTED.value],
+                    "auto_submitted": self.counts[SubmissionStatus.AUTO_SUBMITTED.value],
+                    "score_histogram": [[score, count] for score, count in sorted(self.scores.items())]
+                })
+                self._payload_version = self.version
+            return self._payload
+
+class LiveStatsRegistry:
+    """Aggregates for exam rooms that currently have watchers"""
+
+    def __init__(self):
+        self._stats: Dict[int, ExamLiveStats] = {}
+        self._watchers: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def watch(self, exam_room_id: int) -> ExamLiveStats:
+        """Register a watcher; the aggregates are empty until refresh seeds them"""
+        with self._lock:
+            self._watchers[exam_room_id] += 1
+            stats = self._stats.get(exam_room_id)
+            if stats is None:
+                # Registered before seeding so events committed meanwhile are not lost
+                stats = self._stats[exam_room_id] = ExamLiveStats(exam_room_id)
+            return stats
+
+    def refresh(self, stats: ExamLiveStats, resync_seconds: float = LIVE_STATS_RESYNC_SECONDS):
+        """Seed the aggregates, or re-read them once they are older than resync_seconds.
+
+        Blocking; shared by every watcher of the exam, so only one of them reads.
+        """
+        with self._lock:
+            if not stats.due(resync_seconds):
+                return
+            seed = stats.loaded_at is None
+            stats.loaded_at = time.monotonic()
+
+        db = ReadSessionLocal()
+        try:
+            use_exam_room_shard(db, stats.exam_room_id)
+            rows = db.query(Submission.id, Submission.status, Submission.total_score).filter(
+                Submission.exam_room_id == stats.exam_room_id
+            ).all()
+        finally:
+            db.close()
+        # A resync overrides states the events left wrong, except reopening finished attempts
+        for submission_id, submission_status, score in rows:
+            stats.apply(submission_id, SubmissionStatus(submission_status).value, score or 0, seed=seed)
+
+    def unwatch(self, exam_room_id: int):
+        with self._lock:
+            self._watchers[exam_room_id] -= 1
+            if self._watchers[exam_room_id] <= 0:
+                del self._watchers[exam_room_id]
+                self._stats.pop(exam_room_id, None)
+
+    def on_event(self, event):
+        stats = self._stats.get(event.key)
+        if stats is not None:
+            stats.apply(event.payload["submission_id"], event.payload["status"], event.payload.get("score", 0))
+
+live_stats = LiveStatsRegistry()
+bus.subscribe("submission", live_stats.on_event)
+
+def publish_submission_event(db: Session, exam_room_id: int, submission_id: int, status: SubmissionStatus, score: int = 0):
+    """Broadcast a submission state change once the surrounding transaction commits"""
+    publish_after_commit(
+        db, "submission", exam_room_id,
+        submission_id=submission_id, status=SubmissionStatus(status).value, score=score
+    )
@@ -0,0 +1,111 @@
+"""Priority-aware admission control.
+
+Requests are classified by route into priority classes. An adaptive limit
+on concurrent requests follows observed latency: while the short-term
+average latency stays near the baseline the limit grows, and when
+requests start queueing (latency climbs) it shrinks. Each class may only
+use a share of the limit, so as the server fills up admin and stats
+traffic is turned away first, then reads, then exam starts and autosaves.
+Final submissions are never shed.
+"""
+from typing import FrozenSet, List, Optional, Tuple
+import math
+import os
+import re
+
+CRITICAL = 0   # final submit
+AUTOSAVE = 1   # answer saves
+START = 2      # starting or resuming an attempt, logging in
+READ = 3       # other reads
+ADMIN = 4      # admin writes, listings and stats
+
+# Share of the concurrency limit each class may fill before it is shed
+PRIORITY_SHARES = {CRITICAL: None, AUTOSAVE: 1.0, START: 0.85, READ: 0.7, ADMIN: 0.5}
+
+# (methods or None for any, path pattern, priority); first match wins, unmatched routes are ADMIN
+PRIORITY_RULES: List[Tuple[Optional[FrozenSet[str]], "re.Pattern", int]] = [
+    (frozenset({"POST"}), re.compile(r"^/submissions/\d+/submit$"), CRITICAL),
+    (frozenset({"POST"}), re.compile(r"^/submissions/\d+/answers$"), AUTOSAVE),
+    (frozenset({"POST"}), re.compile(r"^/submissions/start$"), START),
+    (frozenset({"GET"}), re.compile(r"^/submissions/\d+/resume$"), START),
+    (frozenset({"POST"}), re.compile(r"^/auth/(login|token)$"), START),
+    (frozenset({"POST"}), re.compile(r"^/auth/register$"), READ),
+    (None, re.compile(r"^/(users|jobs)(/|$)"), ADMIN),
+    (None, re.compile(r"^/submissions/(stats|exam-room)/"), ADMIN),
+    (frozenset({"GET"}), re.compile(r"^/questions/search$"), ADMIN),
+    (frozenset({"GET", "HEAD"}), re.compile(r""), READ),
+]
+
+# Long-lived event streams; they hold a connection for minutes but are no load on the workers
+UNSHED_ROUTES: List[Tuple[FrozenSet[str], "re.Pattern"]] = [
+    (frozenset({"GET"}), re.compile(r"^/submissions/exam-room/\d+/live$")),
+]
+
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() == "true"
+LOAD_SHED_INITIAL_LIMIT = int(os.getenv("LOAD_SHED_INITIAL_LIMIT", "64"))
+LOAD_SHED_MIN_LIMIT = int(os.getenv("LOAD_SHED_MIN_LIMIT", "8"))
+LOAD_SHED_MAX_LIMIT = int(os.getenv("LOAD_SHED_MAX_LIMIT", "512"))
+# How far short-term latency may rise over the baseline before the limit shrinks
+LOAD_SHED_TOLERANCE = float(os.getenv("LOAD_SHED_TOLERANCE", "2.0"))
+# Retry-After for the lowest shed class; higher classes are told to come back sooner
+LOAD_SHED_RETRY_AFTER = int(os.getenv("LOAD_SHED_RETRY_AFTER", "5"))
+
+def classify(method: str, path: str) -> int:
+    for methods, pattern, priority in PRIORITY_RULES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return priority
+    return ADMIN
+
+def is_unshed(method: str, path: str) -> bool:
+    return any(method in methods and pattern.match(path) for methods, pattern in UNSHED_ROUTES)
+
+class AdaptiveLimiter:
+    """Gradient-style concurrency limit; only used from the event loop, so no locking"""
+
+    def __init__(
+        self,
+        initial: int = LOAD_SHED_INITIAL_LIMIT,
+        minimum: int = LOAD_SHED_MIN_LIMIT,
+        maximum: int = LOAD_SHED_MAX_LIMIT,
+        tolerance: float = LOAD_SHED_TOLERANCE
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.inflight = 0
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self.shed = 0
+
+    def try_acquire(self, priority: int) -> bool:
+        share = PRIORITY_SHARES.get(priority)
+        if share is not None and self.inflight >= self.limit * share:
+            self.shed += 1
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float):
+        inflight = self.inflight
+        self.inflight -= 1
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += 0.1 * (latency - self.short_latency)
+        # The baseline follows faster requests quickly and slower ones only very slowly,
+        # so a sustained overload does not become the new normal
+        alpha = 0.1 if latency < self.long_latency else 0.001
+        self.long_latency += alpha * (latency - self.long_latency)
+
+        # Only a limit that is actually being reached says anything about capacity
+        if inflight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / self.short_latency))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = max(self.minimum, min(self.maximum, 0.8 * self.limit + 0.2 * target))
+
+    def retry_after(self, priority: int) -> int:
+        return max(1, round(LOAD_SHED_RETRY_AFTER * priority / ADMIN))
+
+limiter = AdaptiveLimiter()
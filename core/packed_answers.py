@@ -0,0 +1,132 @@
+"""Packed answer storage.
+
+Exam rooms with ``packed_answers`` enabled keep each submission's answers
+in ``submissions.packed_answers`` instead of one ``answers`` row per
+question. Byte ``i`` of the array holds the answer to the question at
+position ``i``: 0 when unanswered, otherwise the selected option's index
+within the question plus one.
+
+Positions come from question ids and option indexes from option ids, so
+edits to text, marks, order or correct answers keep old arrays valid.
+Adding or removing questions or options would shift them, so the paper
+structure is locked once a packed exam has attempts.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import LargeBinary, cast, func, literal
+from sqlalchemy.orm import Session
+from db.db_config import use_exam_room_shard
+from models.question import Question, Option
+from models.submission import Submission, Answer
+
+# One byte per question
+MAX_OPTIONS_PER_QUESTION = 255
+
+@dataclass
+class PaperLayout:
+    # position -> question id
+    question_ids: List[int] = field(default_factory=list)
+    # question id -> position
+    positions: Dict[int, int] = field(default_factory=dict)
+    # position -> option ids in index order
+    option_ids: List[List[int]] = field(default_factory=list)
+    # option id -> (position, index)
+    option_index: Dict[int, Tuple[int, int]] = field(default_factory=dict)
+    # position -> bitmask of correct option indexes
+    correct_masks: List[int] = field(default_factory=list)
+    # position -> marks
+    marks: List[int] = field(default_factory=list)
+
+def build_paper_layout(db: Session, exam_room_id: int) -> PaperLayout:
+    layout = PaperLayout()
+    use_exam_room_shard(db, exam_room_id)
+    rows = db.query(Question.id, Question.marks, Option.id, Option.is_correct).outerjoin(
+        Option, Option.question_id == Question.id
+    ).filter(Question.exam_room_id == exam_room_id).order_by(Question.id, Option.id).all()
+
+    for question_id, marks, option_id, is_correct in rows:
+        if question_id not in layout.positions:
+            layout.positions[question_id] = len(layout.question_ids)
+            layout.question_ids.append(question_id)
+            layout.option_ids.append([])
+            layout.correct_masks.append(0)
+            layout.marks.append(marks or 0)
+        if option_id is None:
+            continue
+        position = layout.positions[question_id]
+        index = len(layout.option_ids[position])
+        if index >= MAX_OPTIONS_PER_QUESTION:
+            raise ValueError(f"Question {question_id} has too many options to pack")
+        layout.option_ids[position].append(option_id)
+        layout.option_index[option_id] = (position, index)
+        if is_correct:
+            layout.correct_masks[position] |= 1 << index
+    return layout
+
+def empty_packed(layout: PaperLayout) -> bytes:
+    return bytes(len(layout.question_ids))
+
+def encode_answers(layout: PaperLayout, answers: Dict[int, Optional[int]]) -> bytes:
+    """Pack {question_id: selected_option_id}"""
+    packed = bytearray(len(layout.question_ids))
+    for question_id, option_id in answers.items():
+        if option_id is not None:
+            position, index = layout.option_index[option_id]
+            packed[position] = index + 1
+    return bytes(packed)
+
+def decode_answers(layout: PaperLayout, packed: bytes) -> Dict[int, int]:
+    """Unpack to {question_id: selected_option_id} for answered questions"""
+    answers = {}
+    for position, value in enumerate(packed[:len(layout.question_ids)]):
+        if value:
+            answers[layout.question_ids[position]] = layout.option_ids[position][value - 1]
+    return answers
+
+def grade_packed(layout: PaperLayout, packed: bytes) -> Tuple[int, List[bool]]:
+    """Total score and per-position correctness, computed directly on the packed array"""
+    correct = [
+        bool(value) and bool(layout.correct_masks[position] >> (value - 1) & 1)
+        for position, value in enumerate(packed[:len(layout.question_ids)])
+    ]
+    score = sum(marks for marks, is_correct in zip(layout.marks, correct) if is_correct)
+    return score, correct
+
+def answer_view(layout: PaperLayout, submission: Submission) -> List[Answer]:
+    """Transient Answer objects over a packed submission, for code written against answer rows"""
+    _, correct = grade_packed(layout, submission.packed_answers)
+    return [
+        Answer(
+            submission_id=submission.id,
+            question_id=layout.question_ids[position],
+            selected_option_id=layout.option_ids[position][value - 1],
+            is_correct=correct[position]
+        )
+        for position, value in enumerate(submission.packed_answers[:len(layout.question_ids)])
+        if value
+    ]
+
+def packed_set(db: Session, position: int, value: int):
+    """SQL expression writing one byte of submissions.packed_answers in place"""
+    column = Submission.packed_answers
+    if db.get_bind(Submission).dialect.name == "postgresql":
+        return func.set_byte(column, position, value)
+    return cast(
+        func.substr(column, 1, position).concat(literal(bytes([value]), LargeBinary)).concat(
+            func.substr(column, position + 2)
+        ),
+        LargeBinary
+    )
+
+def ensure_paper_unlocked(db: Session, exam_room):
+    """Reject structural edits that would shift packed positions of existing attempts"""
+    if not exam_room.packed_answers:
+        return
+    use_exam_room_shard(db, exam_room.id)
+    has_attempts = db.query(Submission.id).filter(Submission.exam_room_id == exam_room.id).first()
+    if has_attempts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Questions and options cannot be added or removed once a packed exam has attempts"
+        )
@@ -0,0 +1,175 @@
+"""On-demand request profiling.
+
+An admin adds ``X-Profile: 1`` (or ``?profile=1``) to a request to have it
+profiled, and PROFILE_SAMPLE_RATE of all other requests are profiled
+automatically. The endpoint runs under cProfile in the thread that executes
+it, and every SQL statement the request issues is timed. Each profile is
+written to PROFILE_DIR as two files:
+
+    <id>.prof   pstats call data (python -m pstats, snakeviz)
+    <id>.json   request, timings, SQL statements and the top functions
+
+Requests that are not profiled pay one context variable lookup per query.
+Async endpoints share the event loop thread, so their call data also holds
+whatever else ran on the loop while they awaited.
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, List, Optional
+from urllib.parse import parse_qs
+import asyncio
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import random
+import time
+import uuid
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers
+from core.auth import verify_token
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Fraction of requests profiled without being asked, e.g. 0.001
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "40"))
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.status_code: Optional[int] = None
+        self.profiler = cProfile.Profile()
+        self.queries: List[dict] = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def record_query(self, statement: str, seconds: float):
+        self.queries.append({"statement": statement[:2000], "ms": round(seconds * 1000, 3)})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def top_functions(self) -> List[dict]:
+        try:
+            stats = pstats.Stats(self.profiler)
+        except TypeError:
+            # The endpoint never ran (rejected by a dependency)
+            return []
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3)
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows[:PROFILE_TOP_FUNCTIONS]
+        ]
+
+    def save(self, directory: str = PROFILE_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        self.profiler.dump_stats(base + ".prof")
+        sql_ms = sum(query["ms"] for query in self.queries)
+        report = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status_code": self.status_code,
+            "total_ms": round(self.elapsed * 1000, 3),
+            "sql_ms": round(sql_ms, 3),
+            "sql_count": len(self.queries),
+            "queries": self.queries,
+            "top_functions": self.top_functions()
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(
+            f"Profiled {self.method} {self.path} ({self.reason}): {report['total_ms']}ms, "
+            f"{len(self.queries)} queries in {report['sql_ms']}ms -> {base}.json"
+        )
+        return base
+
+def profile_reason(scope) -> Optional[str]:
+    """Why this request should be profiled, or None"""
+    headers = Headers(scope=scope)
+    requested = headers.get("x-profile", "").lower() in ("1", "true")
+    if not requested and b"profile=" in scope.get("query_string", b""):
+        values = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [])
+        requested = any(value.lower() in ("1", "true") for value in values)
+    if requested:
+        # Claims are signed, so this costs no database lookup
+        authorization = headers.get("authorization", "")
+        payload = verify_token(authorization[7:]) if authorization.lower().startswith("bearer ") else None
+        if payload is not None and payload.get("role") == "ADMIN":
+            return "requested"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+def start_profile(method: str, path: str, reason: str):
+    profile = RequestProfile(method, path, reason)
+    return profile, _current_profile.set(profile)
+
+def end_profile(token):
+    _current_profile.reset(token)
+
+def profiled(endpoint: Callable) -> Callable:
+    """Wrap an endpoint so it runs under the current request's profiler, if there is one"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def run_async(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.profiler.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.profiler.disable()
+        return run_async
+
+    @functools.wraps(endpoint)
+    def run(*args, **kwargs):
+        # Sync endpoints run in the threadpool, which copies the request's context
+        profile = _current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profile.profiler.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.profiler.disable()
+    return run
+
+class ProfiledRoute(APIRoute):
+    """Route class for routers whose endpoints can be profiled"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    starts = conn.info.get("profile_query_start")
+    if starts:
+        profile.record_query(statement, time.perf_counter() - starts.pop())
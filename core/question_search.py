@@ -0,0 +1,198 @@
+"""Full-text search over the question bank.
+
+On Postgres the search runs in the database: questions match on the
+``to_tsvector`` GIN index (stemmed words, ranked with ts_rank_cd) or on the
+trigram GIN index (substrings and misspellings, ranked by similarity).
+
+Other databases have neither, so an inverted index of question words is
+kept in process and ranked with BM25. It is loaded on the first search and
+kept current from exam_room invalidations, which every question edit
+publishes: the exam rooms they name are re-read before the next search.
+
+With sharding, each shard returns its best skip + limit matches and the
+page is cut from the merge.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+import math
+import os
+import re
+import threading
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.orm import Session
+from db.db_config import fan_out, shard_of_id, use_shard
+from models.exam_room import ExamRoom
+from models.question import Question, SEARCH_TEXT_CONFIG
+from core.invalidation import bus
+
+# BM25 parameters for the in-process index
+SEARCH_BM25_K1 = float(os.getenv("SEARCH_BM25_K1", "1.2"))
+SEARCH_BM25_B = float(os.getenv("SEARCH_BM25_B", "0.75"))
+
+_WORD = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+@dataclass
+class SearchHit:
+    id: int
+    exam_room_id: int
+    question_text: str
+    marks: int
+    score: float
+    exam_room_title: Optional[str] = None
+
+class QuestionSearchIndex:
+    """Inverted index of question words, for databases without full-text search"""
+
+    def __init__(self, k1: float = SEARCH_BM25_K1, b: float = SEARCH_BM25_B):
+        self.k1 = k1
+        self.b = b
+        # term -> {question_id: occurrences}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # question_id -> (exam_room_id, terms, length)
+        self._documents: Dict[int, Tuple[int, Counter, int]] = {}
+        self._by_exam_room: Dict[int, Set[int]] = {}
+        self._total_length = 0
+        self._loaded = False
+        self._stale: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def on_exam_room_event(self, event):
+        with self._lock:
+            self._stale.add(event.key)
+
+    def refresh(self, db: Session):
+        """Load the index on first use, then re-read exam rooms edited since the last search"""
+        with self._lock:
+            loaded = self._loaded
+            stale, self._stale = self._stale, set()
+        if loaded and not stale:
+            return
+        # Events that arrive while reading mark their exam rooms stale again
+        rows = [
+            row
+            for shard_rows in fan_out(db, lambda session: self._read(session, stale if loaded else None))
+            for row in shard_rows
+        ]
+        with self._lock:
+            if not loaded:
+                self._clear()
+            else:
+                for exam_room_id in stale:
+                    self._remove_exam_room(exam_room_id)
+            for question_id, exam_room_id, question_text in rows:
+                self._add(question_id, exam_room_id, question_text)
+            self._loaded = True
+
+    @staticmethod
+    def _read(db: Session, exam_room_ids: Optional[Set[int]]) -> List[Tuple[int, int, str]]:
+        query = db.query(Question.id, Question.exam_room_id, Question.question_text)
+        if exam_room_ids is not None:
+            query = query.filter(Question.exam_room_id.in_(exam_room_ids))
+        return query.all()
+
+    def _clear(self):
+        self._postings.clear()
+        self._documents.clear()
+        self._by_exam_room.clear()
+        self._total_length = 0
+
+    def _add(self, question_id: int, exam_room_id: int, question_text: str):
+        terms = Counter(tokenize(question_text))
+        length = sum(terms.values())
+        self._documents[question_id] = (exam_room_id, terms, length)
+        self._by_exam_room.setdefault(exam_room_id, set()).add(question_id)
+        self._total_length += length
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[question_id] = count
+
+    def _remove_exam_room(self, exam_room_id: int):
+        for question_id in self._by_exam_room.pop(exam_room_id, ()):
+            _, terms, length = self._documents.pop(question_id)
+            self._total_length -= length
+            for term in terms:
+                postings = self._postings[term]
+                del postings[question_id]
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """(question_id, score) of the best limit matches, best first"""
+        terms = set(tokenize(query))
+        scores: Dict[int, float] = {}
+        with self._lock:
+            count = len(self._documents)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for question_id, frequency in postings.items():
+                    length = self._documents[question_id][2]
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[question_id] = scores.get(question_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+question_index = QuestionSearchIndex()
+bus.subscribe("exam_room", question_index.on_exam_room_event)
+
+def _postgres_search(db: Session, query: str, limit: int) -> List[SearchHit]:
+    text_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_TEXT_CONFIG}'"), query)
+    vector = func.to_tsvector(literal_column(f"'{SEARCH_TEXT_CONFIG}'"), Question.question_text)
+    similarity = func.similarity(Question.question_text, query)
+    score = func.greatest(func.ts_rank_cd(vector, text_query), similarity).label("score")
+    rows = db.query(
+        Question.id, Question.exam_room_id, Question.question_text, Question.marks, score
+    ).filter(or_(
+        vector.op("@@")(text_query),
+        # Substring and similarity (pg_trgm.similarity_threshold) matches both use the trigram index
+        Question.question_text.ilike(f"%{_escape_like(query)}%", escape="!"),
+        Question.question_text.op("%")(query)
+    )).order_by(score.desc(), Question.id).limit(limit).all()
+    return [SearchHit(*row) for row in rows]
+
+def _escape_like(value: str) -> str:
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+def _load_hits(db: Session, ranked: List[Tuple[int, float]]) -> List[SearchHit]:
+    scores = dict(ranked)
+    by_shard: Dict[int, List[int]] = {}
+    for question_id in scores:
+        by_shard.setdefault(shard_of_id(question_id), []).append(question_id)
+    hits = []
+    for shard, question_ids in by_shard.items():
+        use_shard(db, shard)
+        rows = db.query(Question.id, Question.exam_room_id, Question.question_text, Question.marks).filter(
+            Question.id.in_(question_ids)
+        )
+        hits.extend(SearchHit(*row, score=scores[row[0]]) for row in rows)
+    return hits
+
+def _attach_titles(db: Session, hits: List[SearchHit]):
+    exam_room_ids = {hit.exam_room_id for hit in hits}
+    if not exam_room_ids:
+        return
+    titles = dict(db.query(ExamRoom.id, ExamRoom.title).filter(ExamRoom.id.in_(exam_room_ids)).all())
+    for hit in hits:
+        hit.exam_room_title = titles.get(hit.exam_room_id)
+
+def search_questions(db: Session, query: str, skip: int = 0, limit: int = 20) -> List[SearchHit]:
+    """Questions across every exam room matching query, best first"""
+    if not tokenize(query):
+        return []
+    use_shard(db, 0)
+    if db.get_bind(Question).dialect.name == "postgresql":
+        hits = [hit for shard_hits in fan_out(db, lambda session: _postgres_search(session, query, skip + limit)) for hit in shard_hits]
+    else:
+        question_index.refresh(db)
+        hits = _load_hits(db, question_index.search(query, skip + limit))
+    page = sorted(hits, key=lambda hit: (-hit.score, hit.id))[skip:skip + limit]
+    _attach_titles(db, page)
+    return page
@@ -0,0 +1,104 @@
+"""Published exam windows, for student dashboards.
+
+Every published exam room that has not ended is held in memory sorted by
+end time, each with its response body serialized once. A lookup bisects
+past the exams that have ended since the index was built and splits the
+rest into those open now and those starting within the horizon, so the
+dashboard request reads nothing from the database.
+
+Any exam_room invalidation (publish, update, delete, archive) drops the
+index and the next lookup rebuilds it with one query. The rebuild interval
+is a safety net for deployments without a cross-worker invalidation backend.
+"""
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from models.exam_room import ExamRoom
+from schemas.exam_room import ExamRoomOut
+from core.invalidation import bus
+
+# How far ahead upcoming exams are listed
+SCHEDULE_UPCOMING_DAYS = int(os.getenv("SCHEDULE_UPCOMING_DAYS", "30"))
+SCHEDULE_REBUILD_SECONDS = int(os.getenv("SCHEDULE_REBUILD_SECONDS", "300"))
+
+@dataclass(frozen=True)
+class ScheduledExam:
+    id: int
+    start_time: datetime
+    end_time: datetime
+    # Serialized ExamRoomOut
+    body: bytes
+
+class ExamSchedule:
+    def __init__(self, rebuild_seconds: int = SCHEDULE_REBUILD_SECONDS):
+        self.rebuild_seconds = rebuild_seconds
+        # Ordered by end time, with the end times alongside for bisecting
+        self._entries: List[ScheduledExam] = []
+        self._ends: List[datetime] = []
+        self._built_at: Optional[float] = None
+        # Bumped on invalidation so a build racing with a write is not trusted
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+            self._generation += 1
+
+    def rebuild(self, db: Session):
+        with self._lock:
+            generation = self._generation
+        exam_rooms = db.query(ExamRoom).filter(
+            ExamRoom.is_published == True,
+            ExamRoom.end_time >= datetime.utcnow()
+        ).order_by(ExamRoom.end_time, ExamRoom.id).all()
+        entries = [
+            ScheduledExam(
+                id=exam_room.id,
+                start_time=exam_room.start_time,
+                end_time=exam_room.end_time,
+                body=ExamRoomOut.model_validate(exam_room).model_dump_json().encode()
+            )
+            for exam_room in exam_rooms
+        ]
+        with self._lock:
+            self._entries = entries
+            self._ends = [entry.end_time for entry in entries]
+            self._built_at = time.monotonic() if self._generation == generation else None
+
+    def lookup(
+        self,
+        db: Session,
+        now: datetime,
+        horizon: timedelta = timedelta(days=SCHEDULE_UPCOMING_DAYS)
+    ) -> Tuple[List[ScheduledExam], List[ScheduledExam]]:
+        """(open now, closing soonest first; starting within horizon, soonest first)"""
+        with self._lock:
+            built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > self.rebuild_seconds:
+            self.rebuild(db)
+        with self._lock:
+            entries, ends = self._entries, self._ends
+
+        remaining = entries[bisect_left(ends, now):]
+        active = [entry for entry in remaining if entry.start_time <= now]
+        upcoming = sorted(
+            (entry for entry in remaining if now < entry.start_time <= now + horizon),
+            key=lambda entry: (entry.start_time, entry.id)
+        )
+        return active, upcoming
+
+exam_schedule = ExamSchedule()
+bus.subscribe("exam_room", lambda event: exam_schedule.invalidate())
+
+def schedule_body(active: List[ScheduledExam], upcoming: List[ScheduledExam]) -> bytes:
+    """ExamScheduleResponse JSON from the pre-serialized entries"""
+    return b"".join([
+        b'{"active": [', b", ".join(entry.body for entry in active),
+        b'], "upcoming": [', b", ".join(entry.body for entry in upcoming), b"]}"
+    ])
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Union
+import os
+import struct
+import threading
+import zlib
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from models.exam_room import ExamRoom
+from repositories.question import list_paper_questions
+from schemas.question import QuestionOut
+from core.invalidation import bus
+
+# Responses smaller than this are not worth compressing
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "256"))
+
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# An empty final deflate block terminates the stream
+_DEFLATE_END = b"\x03\x00"
+
+def _deflate_segment(data: bytes) -> bytes:
+    """Raw deflate of data ending on a byte boundary, so segments can be concatenated"""
+    compressor = zlib.compressobj(GZIP_COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+class Snapshot:
+    """Serialized JSON body kept alongside its compressed form"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.deflated = _deflate_segment(body)
+        self.gzip_body = gzip_join([self])
+
+Part = Union[bytes, Snapshot]
+
+def gzip_join(parts: List[Part]) -> bytes:
+    """Build a gzip stream from raw bytes and precompressed snapshots without recompressing the snapshots"""
+    crc = 0
+    size = 0
+    chunks = [_GZIP_HEADER]
+    for part in parts:
+        if isinstance(part, Snapshot):
+            body, deflated = part.body, part.deflated
+        else:
+            body, deflated = part, _deflate_segment(part)
+        crc = zlib.crc32(body, crc)
+        size += len(body)
+        chunks.append(deflated)
+    chunks.append(_DEFLATE_END)
+    chunks.append(struct.pack("<II", crc, size & 0xFFFFFFFF))
+    return b"".join(chunks)
+
+def gzip_accepted(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding value allows gzip; an explicit gzip entry overrides *"""
+    weights = {}
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+def accepts_gzip(request: Request) -> bool:
+    return gzip_accepted(request.headers.get("accept-encoding", ""))
+
+def json_response(
+    request: Request,
+    parts: List[Part],
+    headers: Optional[dict] = None,
+    status_code: int = 200
+) -> Response:
+    """JSON response assembled from parts, gzip-encoded when the client accepts it"""
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    size = sum(len(part.body if isinstance(part, Snapshot) else part) for part in parts)
+
+    if size >= GZIP_MINIMUM_SIZE and accepts_gzip(request):
+        if len(parts) == 1 and isinstance(parts[0], Snapshot):
+            body = parts[0].gzip_body
+        else:
+            body = gzip_join(parts)
+        headers["Content-Encoding"] = "gzip"
+        # Each encoding is a distinct representation and needs its own strong ETag
+        if "ETag" in headers:
+            headers["ETag"] = headers["ETag"][:-1] + '-gzip"'
+    else:
+        body = b"".join(part.body if isinstance(part, Snapshot) else part for part in parts)
+
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+class SnapshotCache:
+    """LRU of exam payloads keyed by kind and exam room, valid for one content version.
+
+    Builders returning bytes are stored as Snapshots; anything else (such as
+    an AnswerKey) is stored as is.
+    """
+
+    def __init__(self, max_entries: int = SNAPSHOT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, exam_room: ExamRoom, build: Callable[[], Any]) -> Any:
+        key = (kind, exam_room.id)
+        version = exam_room.content_version
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        # Build outside the lock; concurrent builds of the same version are equivalent
+        value = build()
+        if isinstance(value, bytes):
+            value = Snapshot(value)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or current[0] <= version:
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, exam_room_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == exam_room_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+snapshot_cache = SnapshotCache()
+bus.subscribe("exam_room", lambda event: snapshot_cache.invalidate(event.key))
+
+question_list_adapter = TypeAdapter(List[QuestionOut])
+
+def build_question_snapshot(db: Session, exam_room_id: int) -> bytes:
+    """Student-safe question paper (no correct answers) serialized to JSON"""
+    questions = list_paper_questions(db, exam_room_id)
+    return question_list_adapter.dump_json(question_list_adapter.validate_python(questions, from_attributes=True))
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import logging
+import os
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models.exam_room import ExamRoom
+from schemas.exam_room import ExamRoomWithQuestions
+from core.snapshots import snapshot_cache, build_question_snapshot
+from repositories.exam_room import load_questions
+
+logger = logging.getLogger(__name__)
+
+# Connections opened before the first request arrives
+POOL_PREWARM_CONNECTIONS = int(os.getenv("POOL_PREWARM_CONNECTIONS", "5"))
+# Exams starting within this many minutes (or already running) are preloaded
+PREWARM_WINDOW_MINUTES = int(os.getenv("PREWARM_WINDOW_MINUTES", "60"))
+
+def prewarm_pool(engine: Engine, connections: int = POOL_PREWARM_CONNECTIONS) -> int:
+    """Open pool connections up front so the first requests skip the connect handshake"""
+    size = getattr(engine.pool, "size", lambda: connections)()
+    connections = max(0, min(connections, size))
+    if connections == 0:
+        return 0
+
+    # Hold all connections at once so the pool really opens that many
+    checked_out = [engine.connect() for _ in range(connections)]
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(lambda conn: conn.execute(text("SELECT 1")), checked_out))
+    finally:
+        for conn in checked_out:
+            conn.close()
+    return connections
+
+def prewarm_exam_snapshots(db: Session, window_minutes: int = PREWARM_WINDOW_MINUTES) -> int:
+    """Build the cached papers for published exams that are running or about to start"""
+    now = datetime.utcnow()
+    exam_rooms = db.query(ExamRoom).filter(
+        ExamRoom.is_published == True,
+        ExamRoom.start_time <= now + timedelta(minutes=window_minutes),
+        ExamRoom.end_time >= now
+    ).all()
+
+    for exam_room in exam_rooms:
+        snapshot_cache.get("questions", exam_room, lambda: build_question_snapshot(db, exam_room.id))
+        snapshot_cache.get(
+            "exam-room", exam_room,
+            lambda: ExamRoomWithQuestions.model_validate(load_questions(db, exam_room)).model_dump_json().encode()
+        )
+    return len(exam_rooms)
@@ -1,6 +1,12 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm  import sessionmaker , declarative_base
+from typing import Callable, List, Optional, TypeVar
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm  import Session, sessionmaker , declarative_base, raiseload
+from sqlalchemy.sql.util import find_tables
+from fastapi import Request
 import os
+import threading
+import time
+from core.invalidation import bus
 
 from dotenv import load_dotenv
 # Load .env from current directory or parent directory
@@ -8,9 +14,125 @@ load_dotenv()
 if not os.getenv("DATABASE_URL"):
     load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Without a DATABASE_URL the app runs on a local SQLite file (single-box deployments)
+SQLITE_PATH = os.getenv("SQLITE_PATH", "quiz.db")
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{SQLITE_PATH}"
+SQLITE_MODE = DATABASE_URL.startswith("sqlite")
+
+# SQLite tuning; see https://www.sqlite.org/pragma.html
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+# How long a connection waits for the write lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+# Readers each hold a connection; WAL lets them all run alongside the writer
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "20"))
+
+def sqlite_engine_options() -> dict:
+    return {
+        "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
+        "pool_size": SQLITE_POOL_SIZE
+    }
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # SQLite ignores ON DELETE clauses unless foreign keys are switched on per connection
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # Readers work from a snapshot and neither block nor wait for the writer
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # NORMAL only syncs at checkpoints under WAL; a power cut may lose the last commits but never corrupts
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# Optional horizontal sharding: questions, options, submissions and answers are spread over
+# these databases (comma-separated URLs) by exam_room_id. Users, exam rooms and jobs stay in
+# DATABASE_URL. Commits spanning the primary and a shard are not atomic; `python -m core.counters`
+# repairs the exam room counters if one side fails.
+SHARD_DATABASE_URLS = [url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()]
+SHARDED = bool(SHARD_DATABASE_URLS)
+SHARDED_TABLES = frozenset({"questions", "options", "submissions", "answers", "idempotency_keys"})
+# Each shard hands out ids from its own block of this size, so an id alone names its shard
+SHARD_ID_SPAN = int(os.getenv("SHARD_ID_SPAN", "100000000"))
+
+T = TypeVar("T")
+
+def _create_engine(url: str):
+    return create_engine(url, **(sqlite_engine_options() if url.startswith("sqlite") else {}))
+
+engine = _create_engine(DATABASE_URL)
+shard_engines = [_create_engine(url) for url in SHARD_DATABASE_URLS]
+
+def shard_for_exam_room(exam_room_id: int) -> int:
+    return exam_room_id % len(shard_engines) if SHARDED else 0
+
+def shard_of_id(row_id: int) -> Optional[int]:
+    """Shard that allocated a question, option, submission or answer id; None if none did"""
+    if not SHARDED:
+        return 0
+    shard = (row_id - 1) // SHARD_ID_SPAN
+    return shard if 0 <= shard < len(shard_engines) else None
+
+def use_shard(db: Session, shard: Optional[int]):
+    db.info["shard"] = shard
+
+def use_exam_room_shard(db: Session, exam_room_id: int):
+    """Route the session's sharded queries to the shard holding this exam room's data"""
+    use_shard(db, shard_for_exam_room(exam_room_id))
+
+def use_shard_of(db: Session, row_id: int) -> bool:
+    """Route the session's sharded queries to the shard that allocated row_id; False if it cannot exist"""
+    shard = shard_of_id(row_id)
+    use_shard(db, shard)
+    return shard is not None
+
+def fan_out(db: Session, query: Callable[[Session], T]) -> List[T]:
+    """Run query against every shard in turn and return the per-shard results for the caller to merge"""
+    if not SHARDED:
+        return [query(db)]
+    previous = db.info.get("shard")
+    try:
+        results = []
+        for shard in range(len(shard_engines)):
+            use_shard(db, shard)
+            results.append(query(db))
+        return results
+    finally:
+        use_shard(db, previous)
+
+def _is_sharded(mapper, clause) -> bool:
+    if mapper is not None:
+        return inspect(mapper).local_table.name in SHARDED_TABLES
+    if clause is not None:
+        return any(getattr(table, "name", None) in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+class ShardedSession(Session):
+    """Sends statements on sharded tables to the shard chosen with use_shard and everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if SHARDED and _is_sharded(mapper, clause):
+            shard = self.info.get("shard")
+            if shard is None:
+                raise RuntimeError("No shard selected for a query on questions, options, submissions or answers")
+            return shard_engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+SessionLocal = sessionmaker(class_=ShardedSession, autocommit=False, autoflush=False, bind=engine)
+
+# Optional read replica; without one, reads use the primary
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+read_engine = _create_engine(READ_DATABASE_URL) if READ_DATABASE_URL else engine
+ReadSessionLocal = sessionmaker(class_=ShardedSession, autocommit=False, autoflush=False, bind=read_engine)
+
+for _engine in {engine, read_engine, *shard_engines}:
+    if _engine.dialect.name == "sqlite":
+        event.listen(_engine, "connect", configure_sqlite_connection)
+
+# Users who wrote within this window read from the primary so they see their own writes
+REPLICA_LAG_SECONDS = float(os.getenv("REPLICA_LAG_SECONDS", "5"))
 
 
 Base = declarative_base()
@@ -22,5 +144,93 @@ def get_db():
     finally:
         db.close()
 
+_recent_writes = {}
+_broadcast_writes = {}
+_recent_writes_lock = threading.Lock()
+
+def record_write(user_id: int, at: float = None, broadcast: bool = True):
+    at = at or time.time()
+    with _recent_writes_lock:
+        _recent_writes[user_id] = max(_recent_writes.get(user_id, 0), at)
+        # Tell other workers at most once per lag window per user
+        if broadcast and at - _broadcast_writes.get(user_id, 0) < REPLICA_LAG_SECONDS / 2:
+            broadcast = False
+        if broadcast:
+            _broadcast_writes[user_id] = at
+    if broadcast:
+        bus.publish("user_write", user_id, at=at)
+
+def wrote_recently(user_id: int) -> bool:
+    with _recent_writes_lock:
+        last_write = _recent_writes.get(user_id)
+        if last_write is None:
+            return False
+        if time.time() - last_write > REPLICA_LAG_SECONDS:
+            del _recent_writes[user_id]
+            _broadcast_writes.pop(user_id, None)
+            return False
+        return True
+
+def _request_user_id(request: Request):
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    # Imported here because core.auth depends on this module
+    from core.auth import verify_token
+    payload = verify_token(authorization[7:])
+    if payload is None or payload.get("sub") is None:
+        return None
+    return int(payload["sub"])
+
+def get_read_db(request: Request):
+    """Session for read-only routes, bound to the replica unless the caller just wrote"""
+    if read_engine is engine:
+        session_factory = ReadSessionLocal
+    else:
+        user_id = _request_user_id(request)
+        recent = user_id is not None and wrote_recently(user_id)
+        session_factory = SessionLocal if recent else ReadSessionLocal
+    db = session_factory()
+    db.info["read_only"] = True
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _reject_read_only_writes(session, flush_context, instances):
+    if session.info.get("read_only"):
+        raise RuntimeError("Attempted to write through a read-only session")
+
+event.listen(SessionLocal, "before_flush", _reject_read_only_writes)
+event.listen(ReadSessionLocal, "before_flush", _reject_read_only_writes)
+
+# For test runs: relationships the repositories did not load eagerly raise instead of
+# issuing a query per object during serialization
+RAISE_ON_LAZY_LOAD = os.getenv("RAISE_ON_LAZY_LOAD", "false").lower() == "true"
+
+def _raise_on_lazy_load(orm_execute_state):
+    if orm_execute_state.is_select and not orm_execute_state.is_column_load and not orm_execute_state.is_relationship_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*", sql_only=True))
+
+if RAISE_ON_LAZY_LOAD:
+    event.listen(SessionLocal, "do_orm_execute", _raise_on_lazy_load)
+    event.listen(ReadSessionLocal, "do_orm_execute", _raise_on_lazy_load)
+
+if READ_DATABASE_URL:
+    # Track who wrote through the primary; get_current_user tags the session with the user id
+    @event.listens_for(SessionLocal, "after_flush")
+    def _mark_flush_write(session, flush_context):
+        session.info["wrote"] = True
+
+    @event.listens_for(SessionLocal, "do_orm_execute")
+    def _mark_statement_write(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            orm_execute_state.session.info["wrote"] = True
 
+    @event.listens_for(SessionLocal, "after_commit")
+    def _record_user_write(session):
+        user_id = session.info.get("user_id")
+        if session.info.pop("wrote", False) and user_id is not None:
+            record_write(user_id)
 
+    bus.subscribe("user_write", lambda event: record_write(event.key, event.payload["at"], broadcast=False))
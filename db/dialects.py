@@ -0,0 +1,13 @@
+from sqlalchemy.orm import Session
+
+def dialect_insert(db: Session, entity):
+    """INSERT construct for the session's backend, exposing ON CONFLICT clauses on Postgres and SQLite"""
+    # Ask for the entity's own bind; sharded tables live on another database
+    dialect = db.get_bind(entity).dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(entity)
@@ -0,0 +1,251 @@
+"""Create or update the database schema.
+
+Run explicitly on deploy instead of at import time:
+
+    python -m db.migrate
+
+With SHARD_DATABASE_URLS set, users, exam rooms and jobs are created in
+DATABASE_URL and the sharded tables in every shard.
+"""
+import sys
+import time
+from typing import List
+from sqlalchemy import MetaData, inspect, literal, text
+from db.db_config import engine, shard_engines, Base, SHARDED, SHARDED_TABLES, SHARD_ID_SPAN
+
+# Import models to ensure they are registered with Base
+import models  # noqa: F401
+
+# Denormalized counters that need backfilling when their columns are added
+COUNTER_COLUMNS = {
+    "exam_rooms.question_count", "exam_rooms.total_marks",
+    "exam_rooms.in_progress_count", "exam_rooms.submitted_count", "exam_rooms.auto_submitted_count",
+}
+
+def ensure_foreign_key_actions():
+    """Re-create Postgres foreign keys whose ON DELETE action differs from the models.
+
+    create_all never alters existing tables. New constraints are added NOT VALID
+    and validated separately, so existing rows are checked without blocking writes.
+    SQLite cannot alter constraints; rebuild those databases to pick up cascades.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    inspector = inspect(engine)
+    changed = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = inspector.get_foreign_keys(table.name)
+            for constraint in table.foreign_key_constraints:
+                columns = [column.name for column in constraint.columns]
+                wanted = (constraint.ondelete or "NO ACTION").upper()
+                for fk in existing:
+                    if fk["constrained_columns"] != columns:
+                        continue
+                    current = ((fk.get("options") or {}).get("ondelete") or "NO ACTION").upper()
+                    if current == wanted:
+                        continue
+                    conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{fk["name"]}"'))
+                    conn.execute(text(
+                        f'ALTER TABLE {table.name} ADD CONSTRAINT "{fk["name"]}" '
+                        f'FOREIGN KEY ({", ".join(columns)}) '
+                        f'REFERENCES {fk["referred_table"]} ({", ".join(fk["referred_columns"])}) '
+                        f'ON DELETE {wanted} NOT VALID'
+                    ))
+                    changed.append((table.name, fk["name"]))
+    for table_name, name in changed:
+        with engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table_name} VALIDATE CONSTRAINT "{name}"'))
+    return changed
+
+def shard_metadata() -> MetaData:
+    """The sharded tables as created on each shard.
+
+    Foreign keys to users and exam rooms are dropped because those tables live
+    on the primary; the ones between sharded tables (and their cascades) stay.
+    SQLite tables use AUTOINCREMENT so the shard's id block can be reserved.
+    """
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        if table.name not in SHARDED_TABLES:
+            continue
+        shard_table = table.to_metadata(metadata)
+        shard_table.dialect_options["sqlite"]["autoincrement"] = True
+        # to_metadata does not carry over dialect conditions such as the Postgres-only search indexes
+        conditions = {index.name: index._ddl_if for index in table.indexes}
+        for index in shard_table.indexes:
+            index._ddl_if = conditions.get(index.name)
+        for constraint in list(shard_table.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split(".")[0] in SHARDED_TABLES:
+                continue
+            shard_table.constraints.discard(constraint)
+            for element in constraint.elements:
+                element.parent.foreign_keys.discard(element)
+                shard_table.foreign_keys.discard(element)
+    return metadata
+
+def ensure_shard_id_range(shard: int, shard_engine, tables):
+    """Start every id sequence of the shard at the bottom of its block, so ids never collide across shards"""
+    floor = shard * SHARD_ID_SPAN
+    if floor == 0:
+        return
+    with shard_engine.begin() as conn:
+        for table in tables:
+            if shard_engine.dialect.name == "postgresql":
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM {table.name}), {floor}))"
+                ))
+            elif shard_engine.dialect.name == "sqlite":
+                conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+                ), {"name": table.name})
+                conn.execute(text(
+                    "UPDATE sqlite_sequence SET seq = :floor WHERE name = :name AND seq < :floor"
+                ), {"name": table.name, "floor": floor})
+            else:
+                raise NotImplementedError(f"Shard id ranges are not supported on {shard_engine.dialect.name}")
+
+def ensure_extensions(bind):
+    """Postgres extensions the indexes depend on (pg_trgm for question search)"""
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+def ensure_columns(bind, tables) -> List[str]:
+    """Add columns added to the models after their table was created, which create_all skips.
+
+    NOT NULL columns are added with their model default so existing rows get a
+    value; returns the added columns as table.column.
+    """
+    compiler = bind.dialect.ddl_compiler(bind.dialect, None)
+    added = []
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                specification = compiler.get_column_specification(column)
+                if column.server_default is None and column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, column.type).compile(
+                        dialect=bind.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    specification += f" DEFAULT {default}"
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {specification}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def dedupe_answers(bind) -> int:
+    """Keep the latest answer per (submission, question) so uq_answers_submission_question can be built.
+
+    Tables created before the index may hold duplicates left by racing autosaves.
+    """
+    inspector = inspect(bind)
+    if not inspector.has_table("answers"):
+        return 0
+    existing = {index["name"] for index in inspector.get_indexes("answers")}
+    existing.update(constraint["name"] for constraint in inspector.get_unique_constraints("answers"))
+    if "uq_answers_submission_question" in existing:
+        return 0
+    with bind.begin() as conn:
+        return conn.execute(text(
+            "DELETE FROM answers WHERE id NOT IN "
+            "(SELECT MAX(id) FROM answers GROUP BY submission_id, question_id)"
+        )).rowcount
+
+def ensure_indexes(bind, tables):
+    """Create indexes added to the models after their table was created, which create_all skips.
+
+    A plain CREATE INDEX blocks writes to the table while it builds; run
+    migrations that add indexes to large tables outside exam hours.
+    """
+    dedupe_answers(bind)
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            # Older databases carry some unique indexes as named table constraints
+            constraints = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+            for index in table.indexes:
+                if index.name not in constraints:
+                    index.create(bind=conn, checkfirst=True)
+
+def backfill_counters():
+    """Fill denormalized exam room counters added to an existing table, which start at 0"""
+    from core.counters import reconcile_counters
+    from db.db_config import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return reconcile_counters(db)
+    finally:
+        db.close()
+
+def schema_drift(bind, tables) -> List[str]:
+    """Tables, columns and indexes of the models missing from the database"""
+    inspector = inspect(bind)
+    missing = []
+    for table in tables:
+        if not inspector.has_table(table.name):
+            missing.append(f"table {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(f"column {table.name}.{column.name}" for column in table.columns if column.name not in columns)
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        indexes.update(constraint["name"] for constraint in inspector.get_unique_constraints(table.name))
+        for index in table.indexes:
+            condition = index._ddl_if
+            if condition is not None and condition.dialect and condition.dialect != bind.dialect.name:
+                continue
+            if index.name not in indexes:
+                missing.append(f"index {table.name}.{index.name}")
+    return missing
+
+def migrate() -> List[str]:
+    """Bring every database up to the models; returns what still differs"""
+    if not SHARDED:
+        ensure_extensions(engine)
+        Base.metadata.create_all(bind=engine)
+        added = ensure_columns(engine, Base.metadata.sorted_tables)
+        ensure_indexes(engine, Base.metadata.sorted_tables)
+        ensure_foreign_key_actions()
+        if any(column in COUNTER_COLUMNS for column in added):
+            backfill_counters()
+        return schema_drift(engine, Base.metadata.sorted_tables)
+    global_tables = [table for table in Base.metadata.sorted_tables if table.name not in SHARDED_TABLES]
+    Base.metadata.create_all(bind=engine, tables=global_tables)
+    added = ensure_columns(engine, global_tables)
+    ensure_indexes(engine, global_tables)
+    ensure_foreign_key_actions()
+    drift = schema_drift(engine, global_tables)
+    metadata = shard_metadata()
+    for shard, shard_engine in enumerate(shard_engines):
+        ensure_extensions(shard_engine)
+        metadata.create_all(bind=shard_engine)
+        ensure_columns(shard_engine, metadata.sorted_tables)
+        ensure_indexes(shard_engine, metadata.sorted_tables)
+        ensure_shard_id_range(shard, shard_engine, metadata.sorted_tables)
+        drift.extend(f"{item} on shard {shard}" for item in schema_drift(shard_engine, metadata.sorted_tables))
+    # Counted from the shards, so only once they are all migrated
+    if any(column in COUNTER_COLUMNS for column in added):
+        backfill_counters()
+    return drift
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    drift = migrate()
+    if drift:
+        print("Schema does not match the models:", file=sys.stderr)
+        for item in drift:
+            print(f"  missing {item}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Schema is up to date ({time.perf_counter() - start:.2f}s)")
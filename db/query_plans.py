@@ -0,0 +1,173 @@
+"""Query plan regression check for the hot route queries.
+
+Runs EXPLAIN on the queries behind each route, after ANALYZE, and exits
+non-zero if the planner picks a sequential scan for any of them:
+
+    python -m db.query_plans
+
+Plans depend on table sizes, so point DATABASE_URL at a staging copy with
+production-like data. tests/test_query_plans.py runs the same checks on a
+scratch database filled by seed_plan_data.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+import sys
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Query, Session
+from db.db_config import SessionLocal, use_shard
+from models.user import User
+from models.exam_room import ExamRoom
+from models.question import Question, Option
+from models.submission import Submission, Answer, SubmissionStatus
+
+PLAN_CHECKS: List[Tuple[str, Callable[[Session], Query]]] = [
+    ("auth: user by email", lambda db: db.query(User).filter(User.email == "student@example.com")),
+    ("users: by username", lambda db: db.query(User).filter(User.username == "student")),
+    ("exam-rooms/my-exams", lambda db: db.query(ExamRoom).filter(ExamRoom.created_by == 1)),
+    ("questions/exam-room", lambda db: db.query(Question).filter(
+        Question.exam_room_id == 1
+    ).order_by(Question.order_index)),
+    ("submissions/start: active attempt", lambda db: db.query(Submission).filter(
+        Submission.exam_room_id == 1,
+        Submission.student_id == 1,
+        Submission.status == SubmissionStatus.IN_PROGRESS
+    )),
+    ("submissions/my-history", lambda db: db.query(Submission).filter(
+        Submission.student_id == 1
+    ).order_by(Submission.started_at.desc()).limit(100)),
+    ("submissions/exam-room", lambda db: db.query(Submission).filter(
+        Submission.exam_room_id == 1
+    ).order_by(Submission.started_at.desc()).limit(100)),
+    ("submissions/answers: upsert target", lambda db: db.query(Answer).filter(
+        Answer.submission_id == 1,
+        Answer.question_id == 1
+    )),
+    ("submissions/submit: answers", lambda db: db.query(Answer).filter(Answer.submission_id == 1)),
+    ("submissions/submit: correct option", lambda db: db.query(Option).filter(
+        Option.question_id == 1,
+        Option.is_correct == True
+    )),
+]
+
+# Row counts of seed_plan_data, roughly one term of a mid-sized deployment
+PLAN_SEED_USERS = 5000
+PLAN_SEED_EXAM_ROOMS = 500
+PLAN_SEED_QUESTIONS_PER_EXAM = 20
+PLAN_SEED_OPTIONS_PER_QUESTION = 4
+PLAN_SEED_SUBMISSIONS = 20000
+PLAN_SEED_ANSWERS_PER_SUBMISSION = 10
+
+def seed_plan_data(db: Session, batch_size: int = 5000):
+    """Fill empty tables with representative row counts and value spreads (unsharded databases only)"""
+    now = datetime.utcnow()
+    exam_rooms = PLAN_SEED_EXAM_ROOMS
+    questions_per_exam = PLAN_SEED_QUESTIONS_PER_EXAM
+    options_per_question = PLAN_SEED_OPTIONS_PER_QUESTION
+
+    def insert_rows(model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                db.execute(insert(model), batch)
+                batch = []
+        if batch:
+            db.execute(insert(model), batch)
+
+    insert_rows(User, (
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+        for i in range(1, PLAN_SEED_USERS + 1)
+    ))
+    insert_rows(ExamRoom, (
+        {
+            "id": i, "title": f"Exam {i}", "start_time": now, "end_time": now + timedelta(hours=2),
+            "duration_minutes": 60, "is_published": True, "created_by": i % 50 + 1
+        }
+        for i in range(1, exam_rooms + 1)
+    ))
+    insert_rows(Question, (
+        {
+            "id": (exam_room_id - 1) * questions_per_exam + index + 1, "exam_room_id": exam_room_id,
+            "question_text": f"Question {index} of exam {exam_room_id}", "marks": 1, "order_index": index
+        }
+        for exam_room_id in range(1, exam_rooms + 1)
+        for index in range(questions_per_exam)
+    ))
+    insert_rows(Option, (
+        {
+            "id": (question_id - 1) * options_per_question + index + 1, "question_id": question_id,
+            "option_text": f"Option {index}", "is_correct": index == 0
+        }
+        for question_id in range(1, exam_rooms * questions_per_exam + 1)
+        for index in range(options_per_question)
+    ))
+    # Students spread over exams; one attempt in fifty is still in progress
+    submissions = [
+        {
+            "id": i + 1, "exam_room_id": i % exam_rooms + 1,
+            "student_id": i * 7919 % PLAN_SEED_USERS + 1,
+            "status": SubmissionStatus.IN_PROGRESS if i < PLAN_SEED_USERS and i % 50 == 0 else SubmissionStatus.SUBMITTED,
+            "started_at": now - timedelta(minutes=i), "submitted_at": now - timedelta(minutes=i) + timedelta(minutes=30)
+        }
+        for i in range(PLAN_SEED_SUBMISSIONS)
+    ]
+    insert_rows(Submission, submissions)
+    insert_rows(Answer, (
+        {
+            "submission_id": submission["id"],
+            "question_id": (submission["exam_room_id"] - 1) * questions_per_exam + index + 1,
+            "selected_option_id": None, "is_correct": index % 2 == 0
+        }
+        for submission in submissions
+        for index in range(PLAN_SEED_ANSWERS_PER_SUBMISSION)
+    ))
+    db.commit()
+
+def analyze(db: Session):
+    """Refresh planner statistics, which the plans below depend on"""
+    use_shard(db, 0)
+    for model in (User, Submission):
+        db.execute(text("ANALYZE"), bind_arguments={"mapper": model})
+    db.commit()
+
+def explain(db: Session, query: Query) -> List[str]:
+    # Explain on the database that serves the query, which is a shard for the sharded tables
+    bind_arguments = {"clause": query.statement}
+    dialect = db.get_bind(**bind_arguments).dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "sqlite":
+        return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"), bind_arguments=bind_arguments)]
+    return [row[0] for row in db.execute(text(f"EXPLAIN {sql}"), bind_arguments=bind_arguments)]
+
+def is_sequential_scan(dialect: str, plan_line: str) -> bool:
+    if dialect == "sqlite":
+        # "SCAN t" is a full table scan; "SEARCH t USING INDEX" is an index lookup
+        return plan_line.startswith("SCAN ") and "INDEX" not in plan_line
+    return "Seq Scan" in plan_line
+
+def check_query_plans(db: Session) -> List[Tuple[str, List[str]]]:
+    """Return (name, plan) for every check whose plan contains a sequential scan"""
+    use_shard(db, 0)
+    dialect = db.get_bind().dialect.name
+    failures = []
+    for name, build in PLAN_CHECKS:
+        plan = explain(db, build(db))
+        if any(is_sequential_scan(dialect, line) for line in plan):
+            failures.append((name, plan))
+    db.rollback()
+    return failures
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        analyze(db)
+        failures = check_query_plans(db)
+    finally:
+        db.close()
+
+    for name, plan in failures:
+        print(f"FAIL {name}")
+        for line in plan:
+            print(f"    {line}")
+    print(f"{len(PLAN_CHECKS) - len(failures)}/{len(PLAN_CHECKS)} query plans use indexes")
+    sys.exit(1 if failures else 0)
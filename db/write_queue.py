@@ -0,0 +1,152 @@
+"""Single-writer group commit for SQLite mode.
+
+SQLite has one write lock per database. Rather than having every request
+thread contend for it (and sleep in busy_timeout), autosave and submit
+writes are handed to one writer thread. It takes whatever has queued up
+(up to WRITE_QUEUE_MAX_BATCH, waiting at most WRITE_QUEUE_MAX_WAIT_MS for
+more), runs each write in its own savepoint and commits them together, so
+a burst of autosaves costs one transaction instead of one each. A write
+that fails only rolls back its own savepoint.
+
+On other databases, when sharded (writes go to several databases), and
+whenever the writer is not running (CLI commands, scripts), run_write simply runs the write on the caller's session and
+commits.
+
+    answer_id = run_write(db, lambda session: session.execute(stmt).scalar_one_or_none())
+"""
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, TypeVar
+import logging
+import os
+import queue
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from db.db_config import DATABASE_URL, SHARDED, SQLITE_MODE, configure_sqlite_connection, sqlite_engine_options
+
+logger = logging.getLogger(__name__)
+
+WRITE_QUEUE_ENABLED = SQLITE_MODE and not SHARDED and os.getenv("WRITE_QUEUE_ENABLED", "true").lower() == "true"
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "256"))
+# How long the writer waits for more writes to join a batch once it has one
+WRITE_QUEUE_MAX_WAIT_MS = float(os.getenv("WRITE_QUEUE_MAX_WAIT_MS", "2"))
+
+T = TypeVar("T")
+Write = Callable[[Session], T]
+
+def _writer_session_factory() -> sessionmaker:
+    options = sqlite_engine_options()
+    options["pool_size"] = 1
+    writer_engine = create_engine(DATABASE_URL, **options)
+
+    @event.listens_for(writer_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        configure_sqlite_connection(dbapi_connection, connection_record)
+        # Let SQLAlchemy issue BEGIN itself so SAVEPOINTs behave (pysqlite's own handling breaks them)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def _begin(conn):
+        # Take the write lock up front instead of failing to upgrade a read lock mid-batch
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return sessionmaker(autocommit=False, autoflush=False, bind=writer_engine)
+
+class WriteQueue:
+    def __init__(self, max_batch: int = WRITE_QUEUE_MAX_BATCH, max_wait_ms: float = WRITE_QUEUE_MAX_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[Tuple[Write, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[sessionmaker] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self._session_factory is None:
+            self._session_factory = _writer_session_factory()
+        self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        # Writes queued before the sentinel are still committed
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, work: Write) -> T:
+        """Run work on the writer's session and wait until its batch has committed"""
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future.result()
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Write, Future]]):
+        start = time.perf_counter()
+        session = self._session_factory()
+        outcomes = []
+        try:
+            for work, future in batch:
+                pending = session.info.setdefault("pending_invalidations", [])
+                published = len(pending)
+                savepoint = session.begin_nested()
+                try:
+                    result = work(session)
+                    savepoint.commit()
+                    outcomes.append((future, result, None))
+                except Exception as exc:
+                    savepoint.rollback()
+                    # Invalidations queued by the rolled back write must not be published
+                    del session.info.setdefault("pending_invalidations", [])[published:]
+                    outcomes.append((future, None, exc))
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            logger.error(f"Group commit of {len(batch)} writes failed: {exc}")
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        finally:
+            session.close()
+
+        for future, result, exc in outcomes:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+        logger.debug(f"Group committed {len(batch)} writes in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+write_queue = WriteQueue()
+
+def run_write(db: Session, work: Write) -> T:
+    """Run a write and commit it, through the group-commit writer when it is running"""
+    if WRITE_QUEUE_ENABLED and write_queue.running:
+        return write_queue.submit(work)
+    result = work(db)
+    db.commit()
+    return result
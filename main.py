@@ -1,18 +1,14 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from datetime import datetime
-import os
+import logging
+import time
 
 # Import database configuration
-from db.db_config import engine, Base
-
-# Import models to ensure they are registered with Base
-from models.user import User
-from models.exam_room import ExamRoom
-from models.question import Question, Option
-from models.submission import Submission, Answer
+from db.db_config import engine, SessionLocal
 
 # Import routers
 from routes.auth import router as auth_router
@@ -20,49 +16,87 @@ from routes.user import router as user_router
 from routes.exam_room import router as exam_room_router
 from routes.question import router as question_router
 from routes.submission import router as submission_router
+from routes.jobs import router as jobs_router
 
-from middleware import LoggingMiddleware, ErrorHandlingMiddleware
+from middleware import LoggingMiddleware, ErrorHandlingMiddleware, CompressionMiddleware, LoadSheddingMiddleware, ProfilingMiddleware
+from core.snapshots import GZIP_MINIMUM_SIZE, GZIP_COMPRESS_LEVEL
+from core.startup import prewarm_pool, prewarm_exam_snapshots
+from core.invalidation import bus, create_backend
+from core.bulk_import import shutdown_hash_pool
+from core.jobs import job_worker
+from db.write_queue import WRITE_QUEUE_ENABLED, write_queue
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema changes are applied explicitly with `python -m db.migrate`
+
+logger = logging.getLogger("uvicorn")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start = time.perf_counter()
+    bus.start(create_backend(engine))
+    if WRITE_QUEUE_ENABLED:
+        write_queue.start()
+    job_worker.start()
+    connections = prewarm_pool(engine)
+    db = SessionLocal()
+    try:
+        exams = prewarm_exam_snapshots(db)
+    finally:
+        db.close()
+    logger.info(
+        f"Startup complete in {time.perf_counter() - start:.3f}s "
+        f"({connections} pool connections, {exams} exams preloaded)"
+    )
+    yield
+    job_worker.stop()
+    write_queue.stop()
+    shutdown_hash_pool()
+    bus.stop()
 
 app = FastAPI(
     title="Quiz Master API",
     description="API for Quiz Management System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# CORS Configuration
+# Compress large responses; precompressed snapshot responses pass through untouched
+app.add_middleware(CompressionMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+
+# Custom Middleware
+app.add_middleware(LoggingMiddleware)
+app.add_middleware(ErrorHandlingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+# Early, so shed requests cost as little as possible
+app.add_middleware(LoadSheddingMiddleware)
+
+# CORS Configuration; outermost, so shed (503) responses carry CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
-# Custom Middleware
-app.add_middleware(LoggingMiddleware)
-app.add_middleware(ErrorHandlingMiddleware)
-
 # Include Routers
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(exam_room_router)
 app.include_router(question_router)
 app.include_router(submission_router)
+app.include_router(jobs_router)
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "database": "connected"}
 
 from fastapi.exceptions import RequestValidationError
-import logging
-
-logger = logging.getLogger("uvicorn")
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
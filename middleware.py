@@ -1,13 +1,21 @@
-from fastapi import Request, HTTPException, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.datastructures import Headers
 import time
 import logging
+from fastapi.concurrency import run_in_threadpool
+from core import load_shedding, profiling
+from core.snapshots import gzip_accepted
  
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Requests whose bodies are never logged; bulk registrations carry plaintext passwords
+UNLOGGED_BODY_PATHS = {"/auth/bulk-register"}
+
 class LoggingMiddleware(BaseHTTPMiddleware):
     """Middleware for logging requests and responses"""
     
@@ -15,15 +23,20 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         start_time = time.time()
         
         body = b""
-        if request.method in ["POST", "PUT"]:
+        if request.url.path in UNLOGGED_BODY_PATHS:
+            logged_body = "<omitted>"
+        elif request.method in ["POST", "PUT"]:
             body = await request.body()
             # To allow subsequent access to the body, we need to wrap the request
             async def get_body():
                 return body
             request._receive = get_body
+            logged_body = body.decode('utf-8', errors='ignore')
+        else:
+            logged_body = ""
 
         # Log request
-        logger.info(f"Request: {request.method} {request.url} | Body: {body.decode('utf-8', errors='ignore')}")
+        logger.info(f"Request: {request.method} {request.url} | Body: {logged_body}")
         
         response = await call_next(request)
         
@@ -46,3 +59,99 @@ class ErrorHandlingMiddleware(BaseHTTPMiddleware):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content={"detail": "Internal server error"}
             )
+
+class EventStreamGZipResponder(GZipResponder):
+    """GZipResponder that passes text/event-stream responses through, so each event is flushed immediately"""
+    
+    async def send_with_gzip(self, message):
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith("text/event-stream"):
+                # Treated like an already encoded body: sent on unchanged
+                self.content_encoding_set = True
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZip compression that leaves event streams alone, decided by the response content type.
+
+    Accept-Encoding q-values are honoured the same way json_response honours them,
+    so a client refusing gzip (gzip;q=0) gets an identity body from both.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            if not gzip_accepted(Headers(scope=scope).get("accept-encoding", "")):
+                await self.app(scope, receive, send)
+                return
+            responder = EventStreamGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+class LoadSheddingMiddleware:
+    """Admits requests by route priority under an adaptive concurrency limit; sheds the rest with 503"""
+    
+    def __init__(self, app, limiter=None):
+        self.app = app
+        self.limiter = limiter or load_shedding.limiter
+    
+    async def __call__(self, scope, receive, send):
+        # Event streams are exempted by route, never by a client-controlled header;
+        # CORS preflights are answered without reaching a route, and shedding one would
+        # keep the browser from ever sending the request it precedes (possibly a submit)
+        if (
+            scope["type"] != "http"
+            or not load_shedding.LOAD_SHEDDING_ENABLED
+            or scope["method"] == "OPTIONS"
+            or scope["path"] == "/health"
+            or load_shedding.is_unshed(scope["method"], scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+        
+        priority = load_shedding.classify(scope["method"], scope["path"])
+        if not self.limiter.try_acquire(priority):
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Server is busy, please retry shortly"},
+                headers={"Retry-After": str(self.limiter.retry_after(priority))}
+            )
+            await response(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(time.perf_counter() - start_time)
+
+class ProfilingMiddleware:
+    """Profiles admin-flagged and sampled requests (see core.profiling); others pass straight through"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        reason = profiling.profile_reason(scope) if scope["type"] == "http" else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+        
+        profile, token = profiling.start_profile(scope["method"], scope["path"], reason)
+        
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                if reason == "requested":
+                    message.setdefault("headers", []).append((b"x-profile-id", profile.id.encode()))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiling.end_profile(token)
+            profile.finish()
+            try:
+                await run_in_threadpool(profile.save)
+            except Exception as exc:
+                logger.error(f"Could not save profile {profile.id}: {exc}")
@@ -2,3 +2,5 @@ from .user import User, UserRole
 from .exam_room import ExamRoom
 from .question import Question, Option
 from .submission import Submission, Answer
+from .job import Job, JobStatus
+from .idempotency_key import IdempotencyKey
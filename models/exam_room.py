@@ -14,13 +14,26 @@ class ExamRoom(Base):
     start_time = Column(DateTime, nullable=False )
     end_time = Column(DateTime, nullable=False )
     duration_minutes = Column(Integer, nullable=False)
+    # Denormalized counters, maintained by the question and submission write paths (core.counters)
     total_marks = Column(Integer, nullable=False, default=0)
+    question_count = Column(Integer, nullable=False, default=0)
+    in_progress_count = Column(Integer, nullable=False, default=0)
+    submitted_count = Column(Integer, nullable=False, default=0)
+    auto_submitted_count = Column(Integer, nullable=False, default=0)
     is_published = Column(Boolean, default=False)
-    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Bumped on every change to the exam or its questions/options; drives ETags
+    content_version = Column(Integer, nullable=False, default=1)
+    # Store each attempt's answers as one packed array instead of answer rows
+    packed_answers = Column(Boolean, nullable=False, default=False)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     creator = relationship("User", foreign_keys=[created_by])
-    questions = relationship("Question", back_populates="exam_room", cascade="all, delete-orphan")
-    submissions = relationship("Submission", back_populates="exam_room", cascade="all, delete-orphan")
+    # Children are removed by ON DELETE CASCADE; the ORM never loads them just to delete them
+    questions = relationship(
+        "Question", back_populates="exam_room", cascade="all, delete-orphan", passive_deletes=True,
+        order_by="(Question.order_index, Question.id)"
+    )
+    submissions = relationship("Submission", back_populates="exam_room", cascade="all, delete-orphan", passive_deletes=True)
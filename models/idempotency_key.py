@@ -0,0 +1,23 @@
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, String
+from db.db_config import  Base
+from datetime import datetime
+
+
+class IdempotencyKey(Base):
+    """Result of a request sent with an Idempotency-Key, written in the same transaction as its effect"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # A key names one request per user; retries look it up
+        Index("uq_idempotency_keys_user_key", "user_id", "key", unique=True),
+        # Expired keys are purged by age
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    # Stored on the attempt's shard, next to the answer it describes
+    submission_id = Column(Integer, nullable=False)
+    fingerprint = Column(String(255), nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,42 @@
+from sqlalchemy import JSON, Column, DateTime, Enum, ForeignKey, Index, Integer, String
+from db.db_config import  Base
+from datetime import datetime
+import enum
+
+
+
+class JobStatus(str, enum.Enum):
+    """Background job status enum"""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers claim the oldest pending job
+        Index("ix_jobs_status_id", "status", "id"),
+        # Duplicate checks for jobs on the same target
+        Index("ix_jobs_kind_key_status", "kind", "key", "status"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    # Target of the job, e.g. "exam_room:5"; pending jobs are not duplicated per kind and key
+    key = Column(String(100), nullable=True)
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(Enum(JobStatus, name="jobstatus"), default=JobStatus.PENDING, nullable=False)
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(String(2000), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # Worker that holds the job and when it last proved it is alive
+    worker = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,30 +1,51 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Boolean, text
 from sqlalchemy.orm import   relationship
 from db.db_config import  Base
 
- 
+# Text search configuration of the question search index (Postgres)
+SEARCH_TEXT_CONFIG = "english"
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        # Question papers ordered by position
+        Index("ix_questions_exam_order", "exam_room_id", "order_index"),
+        # Question bank search (core.question_search); other databases use an in-process index
+        Index(
+            "ix_questions_text_search", text(f"to_tsvector('{SEARCH_TEXT_CONFIG}', question_text)"),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_questions_text_trgm", "question_text",
+            postgresql_using="gin", postgresql_ops={"question_text": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    exam_room_id = Column(Integer, ForeignKey("exam_rooms.id"), nullable=False, index=True)
+    exam_room_id = Column(Integer, ForeignKey("exam_rooms.id", ondelete="CASCADE"), nullable=False)
     question_text = Column(String(1000), nullable=False)
     marks = Column(Integer, default=1)
     order_index = Column(Integer, default=0, index=True)
     
     # Relationships
     exam_room = relationship("ExamRoom", back_populates="questions")
-    options = relationship("Option", back_populates="question", cascade="all, delete-orphan")
+    options = relationship(
+        "Option", back_populates="question", cascade="all, delete-orphan", passive_deletes=True,
+        order_by="Option.id"
+    )
     
     
 
 class Option(Base):
     
     __tablename__ = "options"
+    __table_args__ = (
+        # Correct option lookups during grading
+        Index("ix_options_question_correct", "question_id", "is_correct"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
     option_text = Column(String(500), nullable=False)
     is_correct = Column(Boolean, default=False)
     
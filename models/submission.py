@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer
+from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Index, Integer, LargeBinary, text
 from sqlalchemy.orm import  relationship
 from db.db_config import  Base
 from datetime import datetime
@@ -12,35 +12,60 @@ class SubmissionStatus(str, enum.Enum):
     SUBMITTED = "SUBMITTED"
     AUTO_SUBMITTED = "AUTO_SUBMITTED"
 
+# Predicate of the partial index that allows one in-progress attempt per student and exam
+ACTIVE_ATTEMPT_WHERE = text("status = 'IN_PROGRESS'")
+
 class Submission(Base):
     __tablename__ = "submissions"
+    __table_args__ = (
+        Index(
+            "uq_submissions_active_attempt", "exam_room_id", "student_id",
+            unique=True,
+            postgresql_where=ACTIVE_ATTEMPT_WHERE,
+            sqlite_where=ACTIVE_ATTEMPT_WHERE
+        ),
+        # Attempt lookups by exam, student and status
+        Index("ix_submissions_room_student_status", "exam_room_id", "student_id", "status"),
+        # Student history ordered by start time
+        Index("ix_submissions_student_started", "student_id", "started_at"),
+        # Per-exam submission listings ordered by start time
+        Index("ix_submissions_room_started", "exam_room_id", "started_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    exam_room_id = Column(Integer, ForeignKey("exam_rooms.id"), nullable=False, index=True)
-    student_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    exam_room_id = Column(Integer, ForeignKey("exam_rooms.id", ondelete="CASCADE"), nullable=False)
+    student_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     started_at = Column(DateTime, default=datetime.utcnow, index=True)
     submitted_at = Column(DateTime, nullable=True, index=True)
     status = Column(Enum(SubmissionStatus, name="submissionstatus"), default=SubmissionStatus.IN_PROGRESS, index=True)
     total_score = Column(Integer, default=0)
     time_taken_seconds = Column(Integer, nullable=True)
+    # Answers of packed exam rooms, one byte per question (see core.packed_answers)
+    packed_answers = Column(LargeBinary, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     exam_room = relationship("ExamRoom", back_populates="submissions")
     student = relationship("User")
-    answers = relationship("Answer", back_populates="submission", cascade="all, delete-orphan")
+    answers = relationship("Answer", back_populates="submission", cascade="all, delete-orphan", passive_deletes=True)
     
     
 
 
 class Answer(Base):
     __tablename__ = "answers"
+    __table_args__ = (
+        # One answer per question per attempt; save_answer upserts against it
+        # Also serves lookups by submission_id alone. An index rather than a table
+        # constraint so db.migrate can add it to existing tables
+        Index("uq_answers_submission_question", "submission_id", "question_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    submission_id = Column(Integer, ForeignKey("submissions.id"), nullable=False, index=True)
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, index=True)
-    selected_option_id = Column(Integer, ForeignKey("options.id"), nullable=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+    selected_option_id = Column(Integer, ForeignKey("options.id", ondelete="SET NULL"), nullable=True)
     is_correct = Column(Boolean, default=False)
     
     # Relationships
@@ -16,7 +16,7 @@ class User(Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(100), nullable=False,  )
+    username = Column(String(100), nullable=False, index=True)
     email = Column(String(255), unique=True,  nullable=False)
     password_hash = Column(String(255), nullable=False)
     role = Column(Enum(UserRole, name="userrole"), default=UserRole.STUDENT, nullable=False)
@@ -0,0 +1,54 @@
+"""Exam room queries.
+
+Loader strategies are chosen per use case here rather than left to lazy
+loading during serialization, so the number of queries a route makes does
+not grow with the size of the exam.
+"""
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from db.db_config import SHARDED, use_exam_room_shard
+from models.exam_room import ExamRoom
+from models.question import Question
+from models.submission import Submission
+from repositories.question import list_paper_questions
+
+def get_exam_room(db: Session, exam_room_id: int) -> Optional[ExamRoom]:
+    return db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+
+def load_questions(db: Session, exam_room: ExamRoom) -> ExamRoom:
+    """Attach the paper to an exam room that was loaded without it; two queries"""
+    set_committed_value(exam_room, "questions", list_paper_questions(db, exam_room.id))
+    return exam_room
+
+def list_exam_rooms(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    published_only: bool = False,
+    created_by: Optional[int] = None
+) -> List[ExamRoom]:
+    query = db.query(ExamRoom)
+    if published_only:
+        query = query.filter(ExamRoom.is_published == True)
+    if created_by is not None:
+        query = query.filter(ExamRoom.created_by == created_by)
+    return query.offset(skip).limit(limit).all()
+
+def count_exam_rooms(db: Session) -> int:
+    return db.query(ExamRoom).count()
+
+def owns_exam_rooms(db: Session, user_id: int) -> bool:
+    return db.query(ExamRoom.id).filter(ExamRoom.created_by == user_id).first() is not None
+
+def delete_exam_room(db: Session, exam_room: ExamRoom):
+    """Delete an exam room with its paper and attempts.
+
+    Unsharded, ON DELETE CASCADE removes the rows that hang off the exam room;
+    on a shard there is no foreign key to it, so they are deleted here.
+    """
+    if SHARDED:
+        use_exam_room_shard(db, exam_room.id)
+        db.query(Submission).filter(Submission.exam_room_id == exam_room.id).delete(synchronize_session=False)
+        db.query(Question).filter(Question.exam_room_id == exam_room.id).delete(synchronize_session=False)
+    db.delete(exam_room)
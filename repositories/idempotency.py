@@ -0,0 +1,39 @@
+"""Idempotency key queries; keys live on the shard of the attempt they belong to."""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Session
+from db.db_config import fan_out, use_shard_of
+from db.dialects import dialect_insert
+from models.idempotency_key import IdempotencyKey
+
+def get_idempotency_key(db: Session, submission_id: int, user_id: int, key: str, since: datetime) -> Optional[IdempotencyKey]:
+    """The key's stored request, unless it was recorded before since"""
+    if not use_shard_of(db, submission_id):
+        return None
+    return db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key,
+        IdempotencyKey.created_at >= since
+    ).first()
+
+def save_idempotency_key(db: Session, submission_id: int, user_id: int, key: str, fingerprint: str, result: dict):
+    """Record a result; an expired row with the same key is overwritten"""
+    use_shard_of(db, submission_id)
+    stmt = dialect_insert(db, IdempotencyKey).values(
+        user_id=user_id, key=key, submission_id=submission_id,
+        fingerprint=fingerprint, result=result, created_at=datetime.utcnow()
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+        set_={
+            "submission_id": stmt.excluded.submission_id,
+            "fingerprint": stmt.excluded.fingerprint,
+            "result": stmt.excluded.result,
+            "created_at": stmt.excluded.created_at
+        }
+    ))
+
+def delete_idempotency_keys_before(db: Session, cutoff: datetime) -> int:
+    return sum(fan_out(db, lambda session: session.query(IdempotencyKey).filter(
+        IdempotencyKey.created_at < cutoff
+    ).delete(synchronize_session=False)))
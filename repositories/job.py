@@ -0,0 +1,22 @@
+"""Background job queries."""
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from models.job import Job, JobStatus
+
+def get_job(db: Session, job_id: int) -> Optional[Job]:
+    return db.query(Job).filter(Job.id == job_id).first()
+
+def list_jobs(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    job_status: Optional[JobStatus] = None,
+    kind: Optional[str] = None
+) -> List[Job]:
+    """Newest first"""
+    query = db.query(Job)
+    if job_status is not None:
+        query = query.filter(Job.status == job_status)
+    if kind is not None:
+        query = query.filter(Job.kind == kind)
+    return query.order_by(Job.id.desc()).offset(skip).limit(limit).all()
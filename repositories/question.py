@@ -0,0 +1,73 @@
+"""Question and option queries.
+
+Each function selects the shard it reads from: by exam room for a paper,
+by id for a single question or option (see db.db_config).
+"""
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
+from db.db_config import SHARDED, use_exam_room_shard, use_shard_of
+from models.exam_room import ExamRoom
+from models.question import Question, Option
+
+def list_paper_questions(db: Session, exam_room_id: int) -> List[Question]:
+    """An exam's questions in paper order with their options; two queries whatever the paper size"""
+    use_exam_room_shard(db, exam_room_id)
+    return db.query(Question).options(selectinload(Question.options)).filter(
+        Question.exam_room_id == exam_room_id
+    ).order_by(Question.order_index, Question.id).all()
+
+def get_question(db: Session, question_id: int) -> Optional[Question]:
+    if not use_shard_of(db, question_id):
+        return None
+    return db.query(Question).filter(Question.id == question_id).first()
+
+def get_question_with_options(db: Session, question_id: int) -> Optional[Question]:
+    if not use_shard_of(db, question_id):
+        return None
+    return db.query(Question).options(selectinload(Question.options)).filter(
+        Question.id == question_id
+    ).first()
+
+def reload_question_with_options(db: Session, question: Question) -> Question:
+    """Refresh a question after a write, options included"""
+    use_shard_of(db, question.id)
+    return db.query(Question).options(selectinload(Question.options)).filter(
+        Question.id == question.id
+    ).populate_existing().one()
+
+def get_option(db: Session, option_id: int) -> Optional[Option]:
+    if not use_shard_of(db, option_id):
+        return None
+    return db.query(Option).filter(Option.id == option_id).first()
+
+def count_options(db: Session, question_id: int) -> int:
+    if not use_shard_of(db, question_id):
+        return 0
+    return db.query(Option).filter(Option.question_id == question_id).count()
+
+def _exam_room(db: Session, exam_room_id: int) -> Optional[ExamRoom]:
+    return db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+
+def get_question_and_exam_room(db: Session, question_id: int) -> Tuple[Optional[Question], Optional[ExamRoom]]:
+    """A question with the exam room it belongs to, in one query (two when sharded)"""
+    if SHARDED:
+        question = get_question(db, question_id)
+        return (question, _exam_room(db, question.exam_room_id)) if question else (None, None)
+    row = db.query(Question, ExamRoom).join(ExamRoom, ExamRoom.id == Question.exam_room_id).filter(
+        Question.id == question_id
+    ).first()
+    return (row[0], row[1]) if row else (None, None)
+
+def get_option_and_exam_room(db: Session, option_id: int) -> Tuple[Optional[Option], Optional[ExamRoom]]:
+    """An option with the exam room it belongs to, in one query (two when sharded)"""
+    if SHARDED:
+        if not use_shard_of(db, option_id):
+            return None, None
+        row = db.query(Option, Question.exam_room_id).join(Question, Question.id == Option.question_id).filter(
+            Option.id == option_id
+        ).first()
+        return (row[0], _exam_room(db, row[1])) if row else (None, None)
+    row = db.query(Option, ExamRoom).join(Question, Question.id == Option.question_id).join(
+        ExamRoom, ExamRoom.id == Question.exam_room_id
+    ).filter(Option.id == option_id).first()
+    return (row[0], row[1]) if row else (None, None)
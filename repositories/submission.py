@@ -0,0 +1,150 @@
+"""Submission and answer queries.
+
+Queries about one attempt or one exam go to its shard; queries across
+students or exams fan out over every shard and merge (see db.db_config).
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Boolean, Integer, exists, literal, select
+from sqlalchemy.orm import Session
+from db.db_config import SHARDED, fan_out, use_exam_room_shard, use_shard_of
+from db.dialects import dialect_insert
+from models.exam_room import ExamRoom
+from models.submission import Submission, Answer, SubmissionStatus, ACTIVE_ATTEMPT_WHERE
+
+def get_submission(db: Session, submission_id: int) -> Optional[Submission]:
+    if not use_shard_of(db, submission_id):
+        return None
+    return db.query(Submission).filter(Submission.id == submission_id).first()
+
+def list_answers(db: Session, submission_id: int) -> List[Answer]:
+    use_shard_of(db, submission_id)
+    return db.query(Answer).filter(Answer.submission_id == submission_id).all()
+
+def student_history(db: Session, student_id: int, skip: int, limit: Optional[int]) -> List[Tuple[Submission, Optional[str]]]:
+    """A student's attempts, newest first, each with its exam room title (None if the exam is gone)"""
+    if SHARDED:
+        return _sharded_student_history(db, student_id, skip, limit)
+    query = db.query(Submission, ExamRoom.title).outerjoin(
+        ExamRoom, ExamRoom.id == Submission.exam_room_id
+    ).filter(Submission.student_id == student_id).order_by(Submission.started_at.desc())
+    return query.offset(skip).limit(limit).all()
+
+def _sharded_student_history(db: Session, student_id: int, skip: int, limit: Optional[int]) -> List[Tuple[Submission, Optional[str]]]:
+    # Each shard returns its newest skip + limit; the page is cut from the merge
+    def newest(session: Session) -> List[Submission]:
+        query = session.query(Submission).filter(
+            Submission.student_id == student_id
+        ).order_by(Submission.started_at.desc())
+        return query.limit(None if limit is None else skip + limit).all()
+
+    submissions = sorted(
+        (submission for shard_rows in fan_out(db, newest) for submission in shard_rows),
+        key=lambda submission: submission.started_at or datetime.min,
+        reverse=True
+    )
+    page = submissions[skip:] if limit is None else submissions[skip:skip + limit]
+    exam_room_ids = {submission.exam_room_id for submission in page}
+    titles = dict(
+        db.query(ExamRoom.id, ExamRoom.title).filter(ExamRoom.id.in_(exam_room_ids)).all()
+    ) if exam_room_ids else {}
+    return [(submission, titles.get(submission.exam_room_id)) for submission in page]
+
+def student_submissions(db: Session, student_id: int) -> List[Submission]:
+    return [
+        submission
+        for shard_rows in fan_out(db, lambda session: session.query(Submission).filter(
+            Submission.student_id == student_id
+        ).all())
+        for submission in shard_rows
+    ]
+
+def delete_student_submissions(db: Session, student_id: int):
+    """Delete a student's attempts from every shard.
+
+    Unsharded, deleting the user cascades to them in the database instead.
+    """
+    if SHARDED:
+        fan_out(db, lambda session: session.query(Submission).filter(
+            Submission.student_id == student_id
+        ).delete(synchronize_session=False))
+
+def exam_room_submissions(db: Session, exam_room_id: int, skip: int, limit: int) -> List[Submission]:
+    use_exam_room_shard(db, exam_room_id)
+    return db.query(Submission).filter(
+        Submission.exam_room_id == exam_room_id
+    ).order_by(Submission.started_at.desc()).offset(skip).limit(limit).all()
+
+def has_submissions(db: Session, exam_room_id: int) -> bool:
+    use_exam_room_shard(db, exam_room_id)
+    return db.query(Submission.id).filter(Submission.exam_room_id == exam_room_id).first() is not None
+
+def count_submissions(db: Session) -> int:
+    return sum(fan_out(db, lambda session: session.query(Submission).count()))
+
+def count_submitted_between(db: Session, start, end) -> int:
+    return sum(fan_out(db, lambda session: session.query(Submission).filter(
+        Submission.submitted_at >= start,
+        Submission.submitted_at < end
+    ).count()))
+
+def saved_answers(db: Session, submission_id: int) -> List[Tuple[int, Optional[int]]]:
+    """(question_id, selected_option_id) pairs of an attempt, read off the (submission_id, question_id) index"""
+    use_shard_of(db, submission_id)
+    return db.query(Answer.question_id, Answer.selected_option_id).filter(
+        Answer.submission_id == submission_id
+    ).order_by(Answer.question_id).all()
+
+def packed_answers_of(db: Session, submission_id: int) -> Optional[bytes]:
+    use_shard_of(db, submission_id)
+    return db.query(Submission.packed_answers).filter(Submission.id == submission_id).scalar()
+
+def start_attempt(db: Session, values: dict) -> Tuple[int, datetime]:
+    """Create the attempt, or return the one already in progress; (submission id, started_at).
+
+    A single statement arbitrated by the partial unique index on active attempts,
+    so concurrent starts by the same student resolve to one row.
+    """
+    use_exam_room_shard(db, values["exam_room_id"])
+    stmt = dialect_insert(db, Submission).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Submission.exam_room_id, Submission.student_id],
+        index_where=ACTIVE_ATTEMPT_WHERE,
+        set_={"exam_room_id": stmt.excluded.exam_room_id}
+    ).returning(Submission.id, Submission.started_at)
+    return db.execute(stmt).one()
+
+def update_active_attempt(db: Session, submission_id: int, values: Dict) -> int:
+    """Update an attempt only while it is in progress; 0 once a concurrent submit or auto-submit got there first"""
+    return db.query(Submission).filter(
+        Submission.id == submission_id,
+        Submission.status == SubmissionStatus.IN_PROGRESS
+    ).update(values, synchronize_session=False)
+
+def upsert_answer(db: Session, submission_id: int, question_id: int, selected_option_id: Optional[int], is_correct: bool) -> Optional[int]:
+    """Insert or update an answer in one statement; None if the attempt is no longer in progress.
+
+    Concurrent autosaves of the same question resolve on the (submission_id,
+    question_id) unique index. The EXISTS guard rejects writes that race with
+    a submit on another worker.
+    """
+    source = select(
+        literal(submission_id, Integer),
+        literal(question_id, Integer),
+        literal(selected_option_id, Integer),
+        literal(is_correct, Boolean)
+    ).where(exists().where(
+        Submission.id == submission_id,
+        Submission.status == SubmissionStatus.IN_PROGRESS
+    ))
+    stmt = dialect_insert(db, Answer).from_select(
+        ["submission_id", "question_id", "selected_option_id", "is_correct"], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Answer.submission_id, Answer.question_id],
+        set_={
+            "selected_option_id": stmt.excluded.selected_option_id,
+            "is_correct": stmt.excluded.is_correct
+        }
+    ).returning(Answer.id)
+    return db.execute(stmt).scalar_one_or_none()
@@ -0,0 +1,16 @@
+"""User queries."""
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from models.user import User
+
+def get_user(db: Session, user_id: int) -> Optional[User]:
+    return db.query(User).filter(User.id == user_id).first()
+
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+def list_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
+    return db.query(User).offset(skip).limit(limit).all()
+
+def count_users(db: Session) -> int:
+    return db.query(User).count()
@@ -1,24 +1,29 @@
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from db.db_config import get_db
 from models.user import User, UserRole
 from schemas.auth import Token, LoginRequest
-from schemas.user import UserCreate, UserResponse
+from schemas.user import UserCreate, UserResponse, BulkRegisterResponse
 from core.auth import (
     verify_password,
     get_password_hash,
     create_access_token,
+    require_admin,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from core.bulk_import import parse_rows, bulk_register, BULK_REGISTER_MAX_ROWS
+from core.profiling import ProfiledRoute
+from repositories.user import get_user_by_email
 
-router = APIRouter(prefix="/auth", tags=["authentication"])
+router = APIRouter(prefix="/auth", tags=["authentication"], route_class=ProfiledRoute)
 
 @router.post("/register", response_model=UserResponse)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -41,7 +46,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 @router.post("/login", response_model=Token)
 def login(user_credentials: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_credentials.email).first()
+    user = get_user_by_email(db, user_credentials.email)
     
     if not user or not verify_password(user_credentials.password, user.password_hash):
         raise HTTPException(
@@ -63,7 +68,7 @@ def login(user_credentials: LoginRequest, db: Session = Depends(get_db)):
 
 @router.post("/token", response_model=Token)
 def login_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = get_user_by_email(db, form_data.username)
     
     if not user or not verify_password(form_data.password, user.password_hash):
         raise HTTPException(
@@ -83,6 +88,29 @@ def login_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         "token_type": "bearer"
     }
 
+@router.post("/bulk-register", response_model=BulkRegisterResponse)
+async def bulk_register_users(
+    request: Request,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Register many users from a CSV (text/csv) or JSON body and report the outcome per row"""
+    try:
+        rows = parse_rows(request.headers.get("content-type", ""), await request.body())
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not parse users: {exc}"
+        )
+    if len(rows) > BULK_REGISTER_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BULK_REGISTER_MAX_ROWS} users per request"
+        )
+
+    # Hashing and inserts block; keep them off the event loop
+    return await run_in_threadpool(bulk_register, db, rows)
+
 from core.auth import get_current_user
 @router.get("/me", response_model=UserResponse)
 def read_users_me(current_user: User = Depends(get_current_user)):
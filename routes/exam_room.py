@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
-from db.db_config import get_db
+from db.db_config import get_db, get_read_db
 from models.exam_room import ExamRoom
 from models.user import User
-from schemas.exam_room import ExamRoomCreate, ExamRoomUpdate, ExamRoomResponse, ExamRoomWithQuestions
+from schemas.exam_room import ExamRoomCreate, ExamRoomUpdate, ExamRoomResponse, ExamRoomListItem, ExamRoomWithQuestions, ExamScheduleResponse
+from schemas.job import JobResponse
 from core.auth import get_current_active_user, require_admin
+from core.http_cache import exam_etag, etag_matches, exam_cache_control, not_modified, bump_content_version
+from core.invalidation import publish_after_commit
+from core.batch_delete import needs_batched_delete
+from core.jobs import enqueue
+from core.grading import queue_regrade
+from core.snapshots import snapshot_cache, json_response
+from core.schedule import exam_schedule, schedule_body
+from core.profiling import ProfiledRoute
+from repositories.exam_room import delete_exam_room as remove_exam_room, get_exam_room, list_exam_rooms, load_questions
+from repositories.submission import has_submissions
 
-router = APIRouter(prefix="/exam-rooms", tags=["exam-rooms"])
+router = APIRouter(prefix="/exam-rooms", tags=["exam-rooms"], route_class=ProfiledRoute)
 
 @router.post("/", response_model=ExamRoomResponse)
 def create_exam_room(
@@ -28,45 +39,50 @@ def create_exam_room(
         created_by=current_user.id
     )
     db.add(db_exam_room)
+    db.flush()
+    # A room created already published belongs in the in-memory schedule
+    publish_after_commit(db, "exam_room", db_exam_room.id)
     db.commit()
     db.refresh(db_exam_room)
     return db_exam_room
 
-@router.get("/", response_model=List[ExamRoomResponse])
+@router.get("/", response_model=List[ExamRoomListItem])
 def get_exam_rooms(
     skip: int = 0,
     limit: int = 100,
     published_only: bool = False,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    query = db.query(ExamRoom)
-    
-    if published_only:
-        query = query.filter(ExamRoom.is_published == True)
-    
-    exam_rooms = query.offset(skip).limit(limit).all()
-    return exam_rooms
+    return list_exam_rooms(db, skip, limit, published_only=published_only)
 
-@router.get("/my-exams", response_model=List[ExamRoomResponse])
+@router.get("/my-exams", response_model=List[ExamRoomListItem])
 def get_my_exam_rooms(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    return list_exam_rooms(db, skip, limit, created_by=current_user.id)
+
+@router.get("/schedule", response_model=ExamScheduleResponse)
+def get_exam_schedule(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    exam_rooms = db.query(ExamRoom).filter(
-        ExamRoom.created_by == current_user.id
-    ).offset(skip).limit(limit).all()
-    return exam_rooms
+    # Served from the in-memory schedule; the session is only used to rebuild it after a change
+    active, upcoming = exam_schedule.lookup(db, datetime.utcnow())
+    return json_response(request, [schedule_body(active, upcoming)], {"Cache-Control": "no-store"})
 
 @router.get("/{exam_room_id}", response_model=ExamRoomWithQuestions)
 def get_exam_room_by_id(
     exam_room_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -81,7 +97,17 @@ def get_exam_room_by_id(
                 detail="Access denied"
             )
     
-    return exam_room
+    # Answer conditional requests before touching questions or options
+    etag = exam_etag("exam-room", exam_room)
+    cache_control = exam_cache_control(exam_room)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    
+    snapshot = snapshot_cache.get(
+        "exam-room", exam_room,
+        lambda: ExamRoomWithQuestions.model_validate(load_questions(db, exam_room)).model_dump_json().encode()
+    )
+    return json_response(request, [snapshot], {"ETag": etag, "Cache-Control": cache_control})
 
 @router.put("/{exam_room_id}", response_model=ExamRoomResponse)
 def update_exam_room(
@@ -90,7 +116,7 @@ def update_exam_room(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -113,8 +139,17 @@ def update_exam_room(
                 detail="End time must be after start time"
             )
     
+    # Existing attempts are stored in the current answer format
+    if "packed_answers" in update_data and update_data["packed_answers"] != exam_room.packed_answers:
+        if has_submissions(db, exam_room_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Answer storage cannot change once the exam has attempts"
+            )
+    
     for field, value in update_data.items():
         setattr(exam_room, field, value)
+    bump_content_version(db, exam_room.id)
     
     db.commit()
     db.refresh(exam_room)
@@ -123,10 +158,11 @@ def update_exam_room(
 @router.delete("/{exam_room_id}")
 def delete_exam_room(
     exam_room_id: int,
+    response: Response,
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -140,7 +176,22 @@ def delete_exam_room(
             detail="Only the creator or admin can delete this exam room"
         )
     
-    db.delete(exam_room)
+    if needs_batched_delete(db, exam_room_id):
+        # Hide the exam now and remove its attempts in bounded batches in a job
+        exam_room.is_published = False
+        bump_content_version(db, exam_room_id)
+        publish_after_commit(db, "exam_room", exam_room_id, deleted=True)
+        job = enqueue(
+            db, "delete_exam_room", {"exam_room_id": exam_room_id},
+            key=f"exam_room:{exam_room_id}", created_by=current_user.id
+        )
+        db.commit()
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Exam room deletion scheduled", "job_id": job.id}
+
+    # Questions, options, submissions and answers go with it
+    remove_exam_room(db, exam_room)
+    publish_after_commit(db, "exam_room", exam_room_id, deleted=True)
     db.commit()
     return {"message": "Exam room deleted successfully"}
 
@@ -150,7 +201,7 @@ def publish_exam_room(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -165,6 +216,46 @@ def publish_exam_room(
         )
     
     exam_room.is_published = True
+    bump_content_version(db, exam_room.id)
     db.commit()
     db.refresh(exam_room)
     return {"message": "Exam room published successfully"}
+
+@router.post("/reconcile-counters", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def reconcile_exam_room_counters(
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    job = enqueue(db, "reconcile_counters", key="exam_rooms", created_by=current_user.id)
+    db.commit()
+    db.refresh(job)
+    return job
+
+@router.post("/{exam_room_id}/regrade", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def regrade_exam_room_submissions(
+    exam_room_id: int,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    exam_room = get_exam_room(db, exam_room_id)
+    if not exam_room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Exam room not found"
+        )
+    
+    if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the creator or admin can regrade this exam room"
+        )
+    
+    job = queue_regrade(db, exam_room_id, current_user.id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Exam room has no submissions to regrade"
+        )
+    db.commit()
+    db.refresh(job)
+    return job
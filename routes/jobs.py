@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from db.db_config import get_db
+from models.job import JobStatus
+from models.user import User
+from schemas.job import JobResponse
+from core.auth import require_admin
+from core.profiling import ProfiledRoute
+from repositories.job import list_jobs, get_job as find_job
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], route_class=ProfiledRoute)
+
+# Job status is polled while work progresses, so it is always read from the primary
+
+@router.get("/", response_model=List[JobResponse])
+def get_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    job_status: Optional[JobStatus] = None,
+    kind: Optional[str] = None,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    return list_jobs(db, skip, limit, job_status, kind)
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: int,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    job = find_job(db, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import List
-from db.db_config import get_db
+from db.db_config import get_db, get_read_db, use_exam_room_shard
 from models.question import Question, Option
 from models.exam_room import ExamRoom
 from models.user import User
 from schemas.question import (
-    QuestionCreate, QuestionUpdate, QuestionResponse, QuestionOut,
+    QuestionCreate, QuestionUpdate, QuestionResponse, QuestionOut, QuestionSearchResult,
     OptionCreate, OptionUpdate, OptionResponse
 )
 from core.auth import get_current_active_user, require_admin
+from core.http_cache import exam_etag, etag_matches, exam_cache_control, not_modified, bump_content_version
+from core.snapshots import snapshot_cache, json_response, build_question_snapshot
+from core.packed_answers import ensure_paper_unlocked
+from core.counters import adjust_counters, count_question
+from core.grading import queue_regrade
+from core.question_search import search_questions
+from core.profiling import ProfiledRoute
+from repositories.exam_room import get_exam_room
+from repositories.question import (
+    get_question_with_options, reload_question_with_options,
+    get_question_and_exam_room, get_option_and_exam_room, count_options
+)
 
-router = APIRouter(prefix="/questions", tags=["questions"])
+router = APIRouter(prefix="/questions", tags=["questions"], route_class=ProfiledRoute)
 
 @router.post("/exam-room/{exam_room_id}", response_model=QuestionResponse)
 def create_question_nested(
@@ -21,9 +33,11 @@ def create_question_nested(
     db: Session = Depends(get_db)
 ):
     # Check if exam room exists
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(status_code=404, detail="Exam room not found")
+    ensure_paper_unlocked(db, exam_room)
+    use_exam_room_shard(db, exam_room_id)
     
     # Create question
     db_question = Question(
@@ -33,8 +47,7 @@ def create_question_nested(
         order_index=question.order_index
     )
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    db.flush()
     
     # Create options
     for opt in question.options:
@@ -44,19 +57,21 @@ def create_question_nested(
             is_correct=opt.is_correct
         )
         db.add(db_option)
+    count_question(db, exam_room_id, question.marks)
+    bump_content_version(db, exam_room_id)
     
     db.commit()
-    db.refresh(db_question)
-    return db_question
+    return reload_question_with_options(db, db_question)
 
 @router.get("/exam-room/{exam_room_id}", response_model=List[QuestionOut])
 def get_questions_by_exam_room(
     exam_room_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     # Check if exam room exists and user has access
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -71,19 +86,37 @@ def get_questions_by_exam_room(
                 detail="Access denied"
             )
     
-    questions = db.query(Question).filter(
-        Question.exam_room_id == exam_room_id
-    ).order_by(Question.order_index).all()
+    # Answer conditional requests before touching questions or options
+    etag = exam_etag("questions", exam_room)
+    cache_control = exam_cache_control(exam_room)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
     
-    return questions
+    snapshot = snapshot_cache.get("questions", exam_room, lambda: build_question_snapshot(db, exam_room_id))
+    return json_response(request, [snapshot], {"ETag": etag, "Cache-Control": cache_control})
+
+@router.get("/search", response_model=List[QuestionSearchResult])
+def search_question_bank(
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_read_db)
+):
+    if len(q) > 200 or skip < 0 or not 1 <= limit <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search text is limited to 200 characters and pages to 100 results"
+        )
+    return search_questions(db, q, skip, limit)
 
 @router.get("/{question_id}", response_model=QuestionResponse)
 def get_question_by_id(
     question_id: int,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = get_question_with_options(db, question_id)
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -91,7 +124,7 @@ def get_question_by_id(
         )
     
     # Check if user has permission
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == question.exam_room_id).first()
+    exam_room = get_exam_room(db, question.exam_room_id)
     if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -107,7 +140,7 @@ def update_question(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question, exam_room = get_question_and_exam_room(db, question_id)
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -115,7 +148,6 @@ def update_question(
         )
     
     # Check if user has permission
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == question.exam_room_id).first()
     if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -124,12 +156,17 @@ def update_question(
     
     # Update question
     update_data = question_update.dict(exclude_unset=True)
+    previous_marks = question.marks
     for field, value in update_data.items():
         setattr(question, field, value)
+    if question.marks != previous_marks:
+        adjust_counters(db, exam_room.id, {ExamRoom.total_marks: (question.marks or 0) - (previous_marks or 0)})
+        # Scores already awarded for this question are recomputed
+        queue_regrade(db, exam_room.id, current_user.id)
+    bump_content_version(db, exam_room.id)
     
     db.commit()
-    db.refresh(question)
-    return question
+    return reload_question_with_options(db, question)
 
 @router.delete("/{question_id}")
 def delete_question(
@@ -137,7 +174,7 @@ def delete_question(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question, exam_room = get_question_and_exam_room(db, question_id)
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -145,14 +182,18 @@ def delete_question(
         )
     
     # Check if user has permission
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == question.exam_room_id).first()
     if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
+    ensure_paper_unlocked(db, exam_room)
     
     db.delete(question)
+    count_question(db, exam_room.id, question.marks, -1)
+    bump_content_version(db, exam_room.id)
+    # Its answers are cascaded away; finished scores still include them
+    queue_regrade(db, exam_room.id, current_user.id)
     db.commit()
     return {"message": "Question deleted successfully"}
 
@@ -164,7 +205,7 @@ def create_option(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question, exam_room = get_question_and_exam_room(db, question_id)
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -172,15 +213,15 @@ def create_option(
         )
     
     # Check if user has permission
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == question.exam_room_id).first()
     if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
+    ensure_paper_unlocked(db, exam_room)
     
     # Check if question already has max options
-    current_options = db.query(Option).filter(Option.question_id == question_id).count()
+    current_options = count_options(db, question_id)
     if current_options >= 10:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -193,6 +234,7 @@ def create_option(
         is_correct=option.is_correct
     )
     db.add(db_option)
+    bump_content_version(db, exam_room.id)
     db.commit()
     db.refresh(db_option)
     return db_option
@@ -204,7 +246,7 @@ def update_option(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    option = db.query(Option).filter(Option.id == option_id).first()
+    option, exam_room = get_option_and_exam_room(db, option_id)
     if not option:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -212,8 +254,6 @@ def update_option(
         )
     
     # Check if user has permission
-    question = db.query(Question).filter(Question.id == option.question_id).first()
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == question.exam_room_id).first()
     if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -221,8 +261,13 @@ def update_option(
         )
     
     update_data = option_update.dict(exclude_unset=True)
+    was_correct = bool(option.is_correct)
     for field, value in update_data.items():
         setattr(option, field, value)
+    # A changed answer key regrades every answer already given
+    if bool(option.is_correct) != was_correct:
+        queue_regrade(db, exam_room.id, current_user.id)
+    bump_content_version(db, exam_room.id)
     
     db.commit()
     db.refresh(option)
@@ -234,7 +279,7 @@ def delete_option(
     current_user: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    option = db.query(Option).filter(Option.id == option_id).first()
+    option, exam_room = get_option_and_exam_room(db, option_id)
     if not option:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -242,16 +287,15 @@ def delete_option(
         )
     
     # Check if user has permission
-    question = db.query(Question).filter(Question.id == option.question_id).first()
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == question.exam_room_id).first()
     if exam_room.created_by != current_user.id and current_user.role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
+    ensure_paper_unlocked(db, exam_room)
     
     # Check if question has minimum options
-    current_options = db.query(Option).filter(Option.question_id == option.question_id).count()
+    current_options = count_options(db, option.question_id)
     if current_options <= 2:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -259,5 +303,8 @@ def delete_option(
         )
     
     db.delete(option)
+    bump_content_version(db, exam_room.id)
+    # Answers that chose it are cleared by ON DELETE SET NULL
+    queue_regrade(db, exam_room.id, current_user.id)
     db.commit()
     return {"message": "Option deleted successfully"}
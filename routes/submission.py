@@ -1,30 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
-from db.db_config import get_db
-from models.submission import Submission, Answer, SubmissionStatus
-from models.question import Question, Option
-from models.exam_room import ExamRoom
+import asyncio
+import json
+import os
+from db.db_config import get_db, get_read_db, use_shard_of
+from db.write_queue import run_write
+from models.submission import Submission, SubmissionStatus
 from models.user import User
 from schemas.submission import (
-    SubmissionCreate, SubmissionResponse, SubmissionStartResponse,
+    SubmissionCreate, SubmissionResponse, SubmissionStartResponse, SubmissionResumeResponse,
     SubmissionResult, SubmissionHistoryResponse,
     AnswerCreate, AnswerUpdate, AnswerResponse, AnswerResult
 )
 from schemas.question import QuestionOut
 from core.auth import get_current_active_user
+from core.snapshots import snapshot_cache, json_response, build_question_snapshot
+from core.grading import build_answer_key
+from core.idempotency import idempotency_store
+from core.exam_cache import exam_room_cache
+from core.live_stats import live_stats, publish_submission_event
+from core.active_submissions import ActiveSubmission, active_submissions, auto_submit
+from core.packed_answers import build_paper_layout, empty_packed, packed_set, grade_packed, answer_view, decode_answers
+from core.archive import archive_store
+from core.counters import count_submission_transition
+from core.profiling import ProfiledRoute
+from repositories.exam_room import get_exam_room, count_exam_rooms
+from repositories.submission import (
+    get_submission as find_submission, list_answers, student_history, student_submissions,
+    exam_room_submissions, count_submissions, count_submitted_between, saved_answers, packed_answers_of,
+    start_attempt, update_active_attempt, upsert_answer
+)
+from repositories.user import count_users
+
+router = APIRouter(prefix="/submissions", tags=["submissions"], route_class=ProfiledRoute)
 
-router = APIRouter(prefix="/submissions", tags=["submissions"])
+# Seconds between checks for new live aggregates, and between keep-alives when idle
+LIVE_STATS_INTERVAL = float(os.getenv("LIVE_STATS_INTERVAL", "1"))
+LIVE_STATS_KEEPALIVE = float(os.getenv("LIVE_STATS_KEEPALIVE", "15"))
+
+def _active_attempt(db: Session, submission_id: int, current_user: User, now: datetime) -> ActiveSubmission:
+    """The caller's in-progress attempt; an attempt past its deadline is auto-submitted and rejected"""
+    # Everything that follows reads or writes this attempt's shard
+    use_shard_of(db, submission_id)
+    # Ownership, status and deadline come from the active submission registry
+    active = active_submissions.get(db, submission_id)
+    if active is None:
+        # Not in progress; load the row only to report why
+        submission = find_submission(db, submission_id)
+        if not submission:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Submission not found"
+            )
+        if submission.student_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Submission is not active"
+        )
+    
+    # Check if user owns this submission
+    if active.student_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Check if exam time has expired
+    if now > active.deadline:
+        # Auto-submit if time expired, unless a concurrent submit got there first
+        auto_submit(db, active.exam_room_id, submission_id, active.started_at, now)
+        db.commit()
+        active_submissions.remove(submission_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Exam time has expired"
+        )
+    return active
 
 @router.post("/start", response_model=SubmissionStartResponse)
 def start_submission(
     submission: SubmissionCreate,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     # Check if exam room exists and is published
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == submission.exam_room_id).first()
+    exam_room = exam_room_cache.get(db, submission.exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -51,98 +120,104 @@ def start_submission(
             detail="Exam has ended"
         )
     
-    # Check if user already has an active submission
-    existing_submission = db.query(Submission).filter(
-        Submission.exam_room_id == submission.exam_room_id,
-        Submission.student_id == current_user.id,
-        Submission.status == SubmissionStatus.IN_PROGRESS
-    ).first()
-    
-    if existing_submission:
+    # Create the attempt, or return the one already in progress, in a single
+    # statement arbitrated by the partial unique index on active attempts
+    values = {
+        "exam_room_id": exam_room.id,
+        "student_id": current_user.id,
+        "status": SubmissionStatus.IN_PROGRESS,
+        "started_at": now
+    }
+    if exam_room.packed_answers:
+        layout = snapshot_cache.get("layout", exam_room, lambda: build_paper_layout(db, exam_room.id))
+        values["packed_answers"] = empty_packed(layout)
+    submission_id, started_at = start_attempt(db, values)
+    resumed = started_at != now
+    
+    # A resumed attempt whose time has run out is closed instead of reopened
+    time_elapsed = now - started_at
+    if resumed and time_elapsed > timedelta(minutes=exam_room.duration_minutes):
+        auto_submit(db, exam_room.id, submission_id, started_at, now)
+        db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You already have an active submission for this exam"
+            detail="Exam time has expired"
         )
-    
-    # Create new submission
-    db_submission = Submission(
-        exam_room_id=submission.exam_room_id,
-        student_id=current_user.id
-    )
-    db.add(db_submission)
+    if not resumed:
+        count_submission_transition(db, exam_room.id, None, SubmissionStatus.IN_PROGRESS)
+        publish_submission_event(db, exam_room.id, submission_id, SubmissionStatus.IN_PROGRESS)
     db.commit()
-    db.refresh(db_submission)
-    
-    # Get questions for the exam
-    questions = db.query(Question).filter(
-        Question.exam_room_id == submission.exam_room_id
-    ).order_by(Question.order_index).all()
-    
-    # Format questions for response (hide correct answers)
-    formatted_questions = []
-    for question in questions:
-        options = []
-        for option in question.options:
-            options.append({
-                "id": option.id,
-                "option_text": option.option_text
-            })
-        
-        formatted_questions.append({
-            "id": question.id,
-            "question_text": question.question_text,
-            "marks": question.marks,
-            "order_index": question.order_index,
-            "options": options
-        })
-    
-    return SubmissionStartResponse(
-        submission_id=db_submission.id,
+    active_submissions.put(ActiveSubmission(
+        submission_id=submission_id,
         exam_room_id=exam_room.id,
-        exam_room_title=exam_room.title,
-        duration_minutes=exam_room.duration_minutes,
-        questions=formatted_questions
+        student_id=current_user.id,
+        started_at=started_at,
+        deadline=started_at + timedelta(minutes=exam_room.duration_minutes)
+    ))
+    
+    # The question paper (correct answers hidden) is shared by every student and
+    # served from the snapshot cache; only the submission header is per request
+    paper = snapshot_cache.get(
+        "questions", exam_room,
+        lambda: build_question_snapshot(db, exam_room.id)
     )
+    header = json.dumps({
+        "submission_id": submission_id,
+        "exam_room_id": exam_room.id,
+        "exam_room_title": exam_room.title,
+        "duration_minutes": exam_room.duration_minutes,
+        "started_at": started_at.isoformat(),
+        "resumed": resumed
+    })
+    return json_response(request, [header[:-1].encode() + b', "questions": ', paper, b"}"])
 
 @router.get("/my-history", response_model=List[SubmissionHistoryResponse])
 def get_my_submission_history(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    submissions = db.query(Submission).filter(
-        Submission.student_id == current_user.id
-    ).order_by(Submission.started_at.desc()).offset(skip).limit(limit).all()
+    archived = archive_store.student_submissions(current_user.id)
+    if archived:
+        # Page over hot and archived attempts together
+        rows = student_history(db, current_user.id, 0, skip + limit)
+    else:
+        rows = student_history(db, current_user.id, skip, limit)
     
     # Format with exam room titles
     history = []
-    for submission in submissions:
-        exam_room = db.query(ExamRoom).filter(ExamRoom.id == submission.exam_room_id).first()
+    for submission, exam_room_title in rows:
         history.append(SubmissionHistoryResponse(
             id=submission.id,
             exam_room_id=submission.exam_room_id,
-            exam_room_title=exam_room.title if exam_room else "Unknown",
+            exam_room_title=exam_room_title or "Unknown",
             total_score=submission.total_score,
             status=submission.status.value,
             started_at=submission.started_at,
             submitted_at=submission.submitted_at,
             time_taken_seconds=submission.time_taken_seconds
         ))
+
+    if archived:
+        history.extend(SubmissionHistoryResponse.model_validate(submission) for submission in archived)
+        history.sort(key=lambda item: item.started_at, reverse=True)
+        history = history[skip:skip + limit]
     
     return history
 
 @router.get("/stats/overall")
 def get_overall_stats(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Admin only")
         
-    total_users = db.query(User).count()
-    total_exams = db.query(ExamRoom).count()
-    total_submissions = db.query(Submission).count()
+    total_users = count_users(db)
+    archived_exams, archived_submissions = archive_store.totals()
+    total_exams = count_exam_rooms(db) + archived_exams
+    total_submissions = count_submissions(db) + archived_submissions
     
     # Growth over last 7 days
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
@@ -150,10 +225,7 @@ def get_overall_stats(
     for i in range(7):
         day = seven_days_ago + timedelta(days=i)
         next_day = day + timedelta(days=1)
-        count = db.query(Submission).filter(
-            Submission.submitted_at >= day,
-            Submission.submitted_at < next_day
-        ).count()
+        count = count_submitted_between(db, day, next_day) + archive_store.submitted_between(day, next_day)
         submissions_over_time.append({"date": day.strftime("%Y-%m-%d"), "count": count})
         
     return {
@@ -167,9 +239,11 @@ def get_overall_stats(
 def get_submission(
     submission_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    submission = db.query(Submission).filter(Submission.id == submission_id).first()
+    submission = find_submission(db, submission_id)
+    if not submission:
+        submission = archive_store.get_submission(submission_id)
     if not submission:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -185,102 +259,149 @@ def get_submission(
     
     return submission
 
+@router.get("/{submission_id}/resume", response_model=SubmissionResumeResponse)
+def resume_submission(
+    submission_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    now = datetime.utcnow()
+    active = _active_attempt(db, submission_id, current_user, now)
+    exam_room = exam_room_cache.get(db, active.exam_room_id)
+    
+    # Answers saved so far, from one indexed query
+    if exam_room.packed_answers:
+        layout = snapshot_cache.get("layout", exam_room, lambda: build_paper_layout(db, exam_room.id))
+        answers = sorted(decode_answers(layout, packed_answers_of(db, submission_id) or b"").items())
+    else:
+        answers = saved_answers(db, submission_id)
+    
+    # Same shared paper snapshot as /start; only the attempt state is per request
+    paper = snapshot_cache.get(
+        "questions", exam_room,
+        lambda: build_question_snapshot(db, exam_room.id)
+    )
+    header = json.dumps({
+        "submission_id": submission_id,
+        "exam_room_id": exam_room.id,
+        "exam_room_title": exam_room.title,
+        "duration_minutes": exam_room.duration_minutes,
+        "started_at": active.started_at.isoformat(),
+        "deadline": active.deadline.isoformat(),
+        "remaining_seconds": max(0, int((active.deadline - now).total_seconds())),
+        "answers": [
+            {"question_id": question_id, "selected_option_id": option_id}
+            for question_id, option_id in answers
+        ]
+    })
+    return json_response(
+        request,
+        [header[:-1].encode() + b', "questions": ', paper, b"}"],
+        {"Cache-Control": "no-store"}
+    )
+
 @router.post("/{submission_id}/answers", response_model=AnswerResponse)
 def save_answer(
     submission_id: int,
     answer: AnswerCreate,
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    submission = db.query(Submission).filter(Submission.id == submission_id).first()
-    if not submission:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Submission not found"
-        )
+    # Replay the stored result when a client retries a request it already sent
+    fingerprint = f"{submission_id}:{answer.question_id}:{answer.selected_option_id}"
+    if idempotency_key:
+        try:
+            stored = idempotency_store.get(db, submission_id, current_user.id, idempotency_key, fingerprint)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(exc)
+            )
+        if stored is not None:
+            return stored
     
-    # Check if user owns this submission
-    if submission.student_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    now = datetime.utcnow()
+    active = _active_attempt(db, submission_id, current_user, now)
     
-    # Check if submission is still active
-    if submission.status != SubmissionStatus.IN_PROGRESS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Submission is not active"
-        )
+    exam_room = exam_room_cache.get(db, active.exam_room_id)
     
-    # Check if exam time has expired
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == submission.exam_room_id).first()
-    time_elapsed = datetime.utcnow() - submission.started_at
-    if time_elapsed > timedelta(minutes=exam_room.duration_minutes):
-        # Auto-submit if time expired
-        submission.status = SubmissionStatus.AUTO_SUBMITTED
-        submission.submitted_at = datetime.utcnow()
-        submission.time_taken_seconds = int(time_elapsed.total_seconds())
-        db.commit()
+    # Validate question and option against the cached answer key
+    answer_key = snapshot_cache.get("answer-key", exam_room, lambda: build_answer_key(db, exam_room.id))
+    question_options = answer_key.options.get(answer.question_id)
+    if question_options is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Exam time has expired"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found in this exam"
         )
     
-    # Validate question belongs to this exam
-    question = db.query(Question).filter(
-        Question.id == answer.question_id,
-        Question.exam_room_id == submission.exam_room_id
-    ).first()
-    
-    if not question:
+    if answer.selected_option_id and answer.selected_option_id not in question_options:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Question not found in this exam"
+            detail="Option not found for this question"
         )
     
-    # Validate option belongs to this question
-    if answer.selected_option_id:
-        option = db.query(Option).filter(
-            Option.id == answer.selected_option_id,
-            Option.question_id == answer.question_id
-        ).first()
+    is_correct = question_options.get(answer.selected_option_id, False)
+    
+    if exam_room.packed_answers:
+        # Overwrite this question's byte of the packed array in place
+        layout = snapshot_cache.get("layout", exam_room, lambda: build_paper_layout(db, exam_room.id))
+        position = layout.positions[answer.question_id]
+        value = layout.option_index[answer.selected_option_id][1] + 1 if answer.selected_option_id else 0
+        result = {
+            "id": None,
+            "question_id": answer.question_id,
+            "selected_option_id": answer.selected_option_id,
+            "is_correct": is_correct
+        }
         
-        if not option:
+        def write_packed(session: Session) -> int:
+            updated = update_active_attempt(
+                session, submission_id, {Submission.packed_answers: packed_set(session, position, value)}
+            )
+            if updated and idempotency_key:
+                idempotency_store.record(session, submission_id, current_user.id, idempotency_key, fingerprint, result)
+            return updated
+        
+        updated = run_write(db, write_packed)
+        if not updated:
+            active_submissions.remove(submission_id)
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Option not found for this question"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Submission is not active"
             )
-    
-    # Check if answer already exists
-    existing_answer = db.query(Answer).filter(
-        Answer.submission_id == submission_id,
-        Answer.question_id == answer.question_id
-    ).first()
-    
-    if existing_answer:
-        # Update existing answer
-        existing_answer.selected_option_id = answer.selected_option_id
-        if answer.selected_option_id:
-            existing_answer.is_correct = option.is_correct if option else False
-        else:
-            existing_answer.is_correct = False
-        db.commit()
-        db.refresh(existing_answer)
-        return existing_answer
-    else:
-        # Create new answer
-        is_correct = option.is_correct if answer.selected_option_id and option else False
-        db_answer = Answer(
-            submission_id=submission_id,
-            question_id=answer.question_id,
-            selected_option_id=answer.selected_option_id,
-            is_correct=is_correct
+        if idempotency_key:
+            idempotency_store.put(current_user.id, idempotency_key, fingerprint, result)
+        return result
+    
+    # Insert or update in one statement, unless the attempt was submitted meanwhile.
+    # The key's result commits with the answer, so a retry on any worker replays it
+    def write_answer(session: Session) -> Optional[dict]:
+        answer_id = upsert_answer(session, submission_id, answer.question_id, answer.selected_option_id, is_correct)
+        if answer_id is None:
+            return None
+        result = {
+            "id": answer_id,
+            "question_id": answer.question_id,
+            "selected_option_id": answer.selected_option_id,
+            "is_correct": is_correct
+        }
+        if idempotency_key:
+            idempotency_store.record(session, submission_id, current_user.id, idempotency_key, fingerprint, result)
+        return result
+    
+    result = run_write(db, write_answer)
+    if result is None:
+        active_submissions.remove(submission_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Submission is not active"
         )
-        db.add(db_answer)
-        db.commit()
-        db.refresh(db_answer)
-        return db_answer
+    
+    if idempotency_key:
+        idempotency_store.put(current_user.id, idempotency_key, fingerprint, result)
+    return result
 
 @router.post("/{submission_id}/submit", response_model=SubmissionResult)
 def submit_submission(
@@ -288,7 +409,7 @@ def submit_submission(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    submission = db.query(Submission).filter(Submission.id == submission_id).first()
+    submission = find_submission(db, submission_id)
     if not submission:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -309,44 +430,58 @@ def submit_submission(
             detail="Submission is already submitted"
         )
     
-    # Calculate score and finalize submission
-    answers = db.query(Answer).filter(Answer.submission_id == submission_id).all()
-    total_score = sum(1 for answer in answers if answer.is_correct)
-    
-    # Get question marks for accurate scoring
-    for answer in answers:
-        question = db.query(Question).filter(Question.id == answer.question_id).first()
-        if answer.is_correct and question:
-            total_score += question.marks - 1  # Add the actual marks (subtracting the base 1)
-    
-    # Update submission
-    submission.status = SubmissionStatus.SUBMITTED
-    submission.submitted_at = datetime.utcnow()
-    submission.total_score = total_score
-    submission.time_taken_seconds = int((datetime.utcnow() - submission.started_at).total_seconds())
-    
-    db.commit()
+    # Calculate score and finalize submission; marks and correct options come
+    # from the cached answer key rather than a query per answer
+    exam_room = exam_room_cache.get(db, submission.exam_room_id)
+    answer_key = snapshot_cache.get("answer-key", exam_room, lambda: build_answer_key(db, exam_room.id))
+    if submission.packed_answers is not None:
+        # Packed attempts are graded directly on the array
+        layout = snapshot_cache.get("layout", exam_room, lambda: build_paper_layout(db, exam_room.id))
+        total_score, _ = grade_packed(layout, submission.packed_answers)
+        answers = answer_view(layout, submission)
+    else:
+        answers = list_answers(db, submission_id)
+        total_score = sum(answer_key.marks.get(answer.question_id, 0) for answer in answers if answer.is_correct)
     
-    # Format results
+    # Format results before committing, which would expire every answer row
     answer_results = []
     for answer in answers:
-        question = db.query(Question).filter(Question.id == answer.question_id).first()
-        correct_option = db.query(Option).filter(
-            Option.question_id == answer.question_id,
-            Option.is_correct == True
-        ).first()
-        
         answer_results.append(AnswerResult(
             question_id=answer.question_id,
             selected_option_id=answer.selected_option_id,
-            correct_option_id=correct_option.id if correct_option else None,
+            correct_option_id=answer_key.correct.get(answer.question_id),
             is_correct=answer.is_correct
         ))
     
+    # Finalize, unless a concurrent submit or auto-submit got there first
+    submitted_at = datetime.utcnow()
+    exam_room_id = submission.exam_room_id
+    values = {
+        Submission.status: SubmissionStatus.SUBMITTED,
+        Submission.submitted_at: submitted_at,
+        Submission.total_score: total_score,
+        Submission.time_taken_seconds: int((submitted_at - submission.started_at).total_seconds())
+    }
+    
+    def finalize(session: Session) -> int:
+        finalized = update_active_attempt(session, submission_id, values)
+        if finalized:
+            count_submission_transition(session, exam_room_id, SubmissionStatus.IN_PROGRESS, SubmissionStatus.SUBMITTED)
+            publish_submission_event(session, exam_room_id, submission_id, SubmissionStatus.SUBMITTED, total_score)
+        return finalized
+    
+    finalized = run_write(db, finalize)
+    active_submissions.remove(submission_id)
+    if not finalized:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Submission is already submitted"
+        )
+    
     return SubmissionResult(
         submission_id=submission_id,
         total_score=total_score,
-        status=submission.status.value,
+        status=SubmissionStatus.SUBMITTED.value,
         answers=answer_results
     )
 
@@ -357,10 +492,10 @@ def get_exam_room_submissions(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     # Check if exam room exists and user has permission
-    exam_room = db.query(ExamRoom).filter(ExamRoom.id == exam_room_id).first()
+    exam_room = get_exam_room(db, exam_room_id)
     if not exam_room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -374,9 +509,7 @@ def get_exam_room_submissions(
             detail="Access denied"
         )
     
-    submissions = db.query(Submission).filter(
-        Submission.exam_room_id == exam_room_id
-    ).order_by(Submission.started_at.desc()).offset(skip).limit(limit).all()
+    submissions = exam_room_submissions(db, exam_room_id, skip, limit)
     
     # Format with exam room titles
     history = []
@@ -394,16 +527,69 @@ def get_exam_room_submissions(
     
     return history
 
+@router.get("/exam-room/{exam_room_id}/live")
+def stream_exam_room_live_stats(
+    exam_room_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_read_db)
+):
+    exam_room = get_exam_room(db, exam_room_id)
+    if not exam_room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Exam room not found"
+        )
+    
+    # Only admin or creator can monitor an exam
+    if current_user.role != "ADMIN" and exam_room.created_by != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    # Aggregates are seeded once and then kept current from submission events,
+    # so every watcher of this exam shares them. The watcher is registered in the
+    # generator, whose finally always runs once it has started; a client gone
+    # before the first iteration never registers one
+    async def events():
+        stats = live_stats.watch(exam_room_id)
+        try:
+            sent_version = -1
+            idle = 0.0
+            while not await request.is_disconnected():
+                # Seeds on first use, then periodically re-reads in case an event was lost
+                if stats.due():
+                    await run_in_threadpool(live_stats.refresh, stats)
+                if stats.version != sent_version:
+                    sent_version = stats.version
+                    idle = 0.0
+                    yield f"event: stats\ndata: {stats.payload()}\n\n"
+                elif idle >= LIVE_STATS_KEEPALIVE:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+                await asyncio.sleep(LIVE_STATS_INTERVAL)
+                idle += LIVE_STATS_INTERVAL
+        finally:
+            live_stats.unwatch(exam_room_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/stats/user/{user_id}")
 def get_user_stats(
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if current_user.role != "ADMIN" and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    submissions = db.query(Submission).filter(Submission.student_id == user_id).all()
+    submissions = student_submissions(db, user_id)
+    submissions.extend(archive_store.student_submissions(user_id))
     
     performance_over_time = []
     for sub in submissions:
@@ -412,6 +598,7 @@ def get_user_stats(
                 "date": sub.submitted_at.strftime("%Y-%m-%d"),
                 "score": sub.total_score
             })
+    performance_over_time.sort(key=lambda point: point["date"])
             
     return {
         "submissions_count": len(submissions),
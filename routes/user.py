@@ -1,12 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-from db.db_config import get_db
+from db.db_config import get_db, get_read_db
 from models.user import User
+from models.submission import Submission
 from schemas.user import UserResponse, UserUpdate
 from core.auth import get_current_active_user, require_admin
+from core.invalidation import publish_after_commit
+from core.counters import uncount_submissions
+from core.profiling import ProfiledRoute
+from repositories.exam_room import owns_exam_rooms
+from repositories.submission import delete_student_submissions
+from repositories.user import get_user, list_users
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=ProfiledRoute)
 
 @router.get("/me", response_model=UserResponse)
 def get_current_user_info(current_user: User = Depends(get_current_active_user)):
@@ -20,6 +27,7 @@ def update_current_user(
 ):
     for field, value in user_update.dict(exclude_unset=True).items():
         setattr(current_user, field, value)
+    publish_after_commit(db, "user", current_user.id)
     
     db.commit()
     db.refresh(current_user)
@@ -30,18 +38,18 @@ def get_all_users(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    users = db.query(User).offset(skip).limit(limit).all()
+    users = list_users(db, skip, limit)
     return users
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user_by_id(
     user_id: int,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_user(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -61,13 +69,24 @@ def delete_user(
             detail="Cannot delete yourself"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_user(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
+    # Exam rooms are kept; deleting their creator would orphan other students' results
+    if owns_exam_rooms(db, user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User still owns exam rooms"
+        )
+    
+    # Their submissions and answers go with them through ON DELETE CASCADE (explicitly on shards)
+    uncount_submissions(db, Submission.student_id == user_id)
+    delete_student_submissions(db, user_id)
     db.delete(user)
+    publish_after_commit(db, "user", user_id, deleted=True)
     db.commit()
     return {"message": "User deleted successfully"}
\ No newline at end of file
@@ -8,8 +8,8 @@ class ExamRoomBase(BaseModel):
     start_time: datetime = Field(default_factory=datetime.now)
     end_time: datetime = Field(default_factory=datetime.now)
     duration_minutes: int = Field(30, ge=1, le=300)
-    total_marks: int = Field(0, ge=0)
     is_published: bool = Field(False)
+    packed_answers: bool = Field(False)
 
 class ExamRoomCreate(ExamRoomBase):
     pass
@@ -20,18 +20,28 @@ class ExamRoomUpdate(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     duration_minutes: Optional[int] = Field(None, ge=1, le=300)
-    total_marks: Optional[int] = Field(None, ge=0)
     is_published: Optional[bool] = None
+    packed_answers: Optional[bool] = None
 
 class ExamRoomResponse(ExamRoomBase):
     id: int
     created_by: int
+    # Maintained from the exam's questions
+    total_marks: int = 0
+    question_count: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+class ExamRoomListItem(ExamRoomResponse):
+    # Attempt counts change without a content version bump, so they are only
+    # returned by listings and never by the cached exam representation
+    in_progress_count: int = 0
+    submitted_count: int = 0
+    auto_submitted_count: int = 0
+
 class ExamRoomOut(ExamRoomBase):
     id: int
     created_by: int
@@ -40,6 +50,12 @@ class ExamRoomOut(ExamRoomBase):
     class Config:
         from_attributes = True
 
+class ExamScheduleResponse(BaseModel):
+    # Published exams open now, closing soonest first
+    active: List[ExamRoomOut]
+    # Published exams starting within the schedule horizon, soonest first
+    upcoming: List[ExamRoomOut]
+
 class ExamRoomWithQuestions(ExamRoomResponse):
     questions: List['QuestionResponse'] = []
 
@@ -51,3 +51,14 @@ class QuestionOut(QuestionBase):
     
     class Config:
         from_attributes = True
+
+class QuestionSearchResult(BaseModel):
+    id: int
+    exam_room_id: int
+    exam_room_title: Optional[str] = None
+    question_text: str
+    marks: int
+    score: float
+    
+    class Config:
+        from_attributes = True
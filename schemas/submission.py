@@ -10,7 +10,8 @@ class AnswerUpdate(BaseModel):
     selected_option_id: Optional[int] = None
 
 class AnswerResponse(BaseModel):
-    id: int
+    # None for answers of packed exam rooms, which have no answer rows
+    id: Optional[int] = None
     question_id: int
     selected_option_id: Optional[int]
     is_correct: bool
@@ -49,6 +50,24 @@ class SubmissionStartResponse(BaseModel):
     exam_room_id: int
     exam_room_title: str
     duration_minutes: int
+    started_at: datetime
+    resumed: bool = False
+    questions: List[dict]
+
+class SavedAnswer(BaseModel):
+    question_id: int
+    selected_option_id: Optional[int]
+
+class SubmissionResumeResponse(BaseModel):
+    submission_id: int
+    exam_room_id: int
+    exam_room_title: str
+    duration_minutes: int
+    started_at: datetime
+    deadline: datetime
+    # Computed by the server so client clock skew does not shorten or extend the attempt
+    remaining_seconds: int
+    answers: List[SavedAnswer]
     questions: List[dict]
 
 class SubmissionResult(BaseModel):
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from models.user import UserRole
 
 class UserBase(BaseModel):
@@ -33,3 +33,15 @@ class UserOut(UserBase):
     
     class Config:
         from_attributes = True
+
+class BulkRegisterRow(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkRegisterResponse(BaseModel):
+    created: int
+    failed: int
+    rows: List[BulkRegisterRow]
@@ -0,0 +1,13 @@
+"""Test configuration; must run before any application module reads its settings."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix="quiz-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'app.sqlite')}")
+# Relationships the repositories did not load eagerly raise instead of issuing a query per object
+os.environ["RAISE_ON_LAZY_LOAD"] = "true"
+os.environ.setdefault("INVALIDATION_BACKEND", "local")
+os.environ.setdefault("LOAD_SHEDDING_ENABLED", "false")
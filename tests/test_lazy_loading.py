@@ -0,0 +1,77 @@
+"""Routes load what they serialize through the repositories; RAISE_ON_LAZY_LOAD is on for the suite (see conftest).
+
+A relationship touched without an eager load raises, which the error middleware
+turns into a 500, so a new N+1 access path fails here.
+"""
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from db.db_config import RAISE_ON_LAZY_LOAD, Base, engine
+import main
+
+@pytest.fixture(scope="module")
+def client():
+    Base.metadata.create_all(bind=engine)
+    yield TestClient(main.app)
+    Base.metadata.drop_all(bind=engine)
+
+def _login(client: TestClient, email: str, role: str) -> dict:
+    client.post("/auth/register", json={"username": email.split("@")[0], "email": email, "password": "pw", "role": role})
+    token = client.post("/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(scope="module")
+def exam(client):
+    admin = _login(client, "admin@example.com", "ADMIN")
+    student = _login(client, "student@example.com", "STUDENT")
+    now = datetime.utcnow()
+    exam_room_id = client.post("/exam-rooms/", headers=admin, json={
+        "title": "Lazy loading", "start_time": (now - timedelta(hours=1)).isoformat(),
+        "end_time": (now + timedelta(hours=2)).isoformat(), "duration_minutes": 60, "is_published": True
+    }).json()["id"]
+    questions = [
+        client.post(f"/questions/exam-room/{exam_room_id}", headers=admin, json={
+            "question_text": f"Question {index}", "marks": 2, "order_index": index,
+            "options": [{"option_text": "a", "is_correct": True}, {"option_text": "b"}, {"option_text": "c"}]
+        }).json()
+        for index in range(3)
+    ]
+    return {"admin": admin, "student": student, "exam_room_id": exam_room_id, "questions": questions}
+
+def test_flag_is_on():
+    assert RAISE_ON_LAZY_LOAD
+
+def test_exam_and_question_routes(client, exam):
+    admin, exam_room_id = exam["admin"], exam["exam_room_id"]
+    question_id = exam["questions"][0]["id"]
+    for path in [
+        "/exam-rooms/", "/exam-rooms/my-exams", "/exam-rooms/schedule", f"/exam-rooms/{exam_room_id}",
+        f"/questions/exam-room/{exam_room_id}", f"/questions/{question_id}", "/questions/search?q=question",
+    ]:
+        response = client.get(path, headers=admin)
+        assert response.status_code == 200, (path, response.text)
+
+def test_submission_routes(client, exam):
+    admin, student, exam_room_id = exam["admin"], exam["student"], exam["exam_room_id"]
+    response = client.post("/submissions/start", headers=student, json={"exam_room_id": exam_room_id})
+    assert response.status_code == 200, response.text
+    submission_id = response.json()["submission_id"]
+    for question in exam["questions"]:
+        response = client.post(f"/submissions/{submission_id}/answers", headers=student, json={
+            "question_id": question["id"], "selected_option_id": question["options"][0]["id"]
+        })
+        assert response.status_code == 200, response.text
+    response = client.get(f"/submissions/{submission_id}/resume", headers=student)
+    assert response.status_code == 200, response.text
+    response = client.post(f"/submissions/{submission_id}/submit", headers=student)
+    assert response.status_code == 200, response.text
+    assert response.json()["total_score"] == 6
+
+    for path, headers in [
+        (f"/submissions/{submission_id}", student),
+        ("/submissions/my-history", student),
+        (f"/submissions/exam-room/{exam_room_id}/submissions", admin),
+        ("/submissions/stats/overall", admin),
+    ]:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.text)
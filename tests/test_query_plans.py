@@ -0,0 +1,27 @@
+"""The hot route queries use indexes at realistic table sizes (see db.query_plans)."""
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from db.db_config import Base, sqlite_engine_options
+from db.query_plans import analyze, check_query_plans, seed_plan_data
+import models  # noqa: F401
+
+@pytest.fixture(scope="module")
+def seeded_db(tmp_path_factory):
+    # A database of its own, so the seeded volume does not leak into other tests
+    url = os.getenv("PLAN_TEST_DATABASE_URL") or f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.sqlite'}"
+    engine = create_engine(url, **(sqlite_engine_options() if url.startswith("sqlite") else {}))
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = Session(bind=engine)
+    seed_plan_data(db)
+    analyze(db)
+    yield db
+    db.close()
+    engine.dispose()
+
+def test_no_sequential_scans(seeded_db):
+    failures = check_query_plans(seeded_db)
+    assert not failures, "\n".join(f"{name}: {plan}" for name, plan in failures)
+